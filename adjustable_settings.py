@@ -5,15 +5,38 @@
 LOCATION_LATITUDE_ = 45.031553
 LOCATION_LONGITUDE = -93.024759
 
+# More locations to show, as (latitude, longitude) pairs, e.g. [(40.712776, -74.005974)].
+# The A and B buttons switch between them, starting with the location above.
+EXTRA_LOCATIONS = []
+
+# Switch to the next location on its own every this many seconds. Set to None to only switch
+# with the buttons.
+LOCATION_ROTATE_INTERVAL = None
+
 # Number set to display
 LANGUAGE = "English"
 
-# metric or imperial
+# metric or imperial, shown at startup. Hold the Y button to switch while running.
 UNIT_KIND = "imperial"
 
 # Delay between transitions
 TIME_DELAY = 0.05
 REFRESH_INTERVAL = 300  # 5 minutes
 
+# Refresh on the minute (e.g. 10:05:00, 10:10:00) rather than REFRESH_INTERVAL after starting
+ALIGN_REFRESH_TO_MINUTE = True
+
+# While the display is hidden with the X button, keep fetching the forecast this often so it can
+# be shown straight away again. Set to None to stop fetching while hidden.
+HIDDEN_REFRESH_INTERVAL = 1800  # 30 minutes
+
+# Check the screen at startup with a few test patterns: "cold_boot" only after the Pi boots (not
+# when the program restarts), "always", "never", or "numbers" for the slower drawing of every
+# number.
+STARTUP_TEST = "cold_boot"
+
+# Draw numbers stroke by stroke (one screen update per pixel) instead of all at once
+ANIMATE_DRAWING = False
+
 # Screen brightness
 SCREEN_BRIGHTNESS = 0.03
@@ -0,0 +1,3 @@
+"""Benchmarks for the weather station. Run them from the repository root, e.g.
+python -m benchmarks.onecall_fetch, or all of the render and fetch ones with
+python -m benchmarks.suite"""
@@ -0,0 +1,52 @@
+"""Benchmark the One Call payload before and after excluding the blocks the display doesn't use.
+
+Reports bytes transferred, JSON parse time and peak memory for the full payload and the slim one
+requested by weather.fetch_forecast, as JSON."""
+import json
+import time
+import tracemalloc
+
+from benchmarks.payloads import onecall_payload
+from weather import exclude_parameter, extract_forecast
+
+REPEATS = 200
+
+
+def measure(body: bytes, keep_payload: bool) -> dict:
+    """Parse the body REPEATS times, keeping either the whole payload or only the Forecast."""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        payload = json.loads(body)
+        if not keep_payload:
+            payload = extract_forecast(payload)
+    parse_seconds = (time.perf_counter() - start) / REPEATS
+
+    tracemalloc.start()
+    payload = json.loads(body)
+    if not keep_payload:
+        payload = extract_forecast(payload)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "bytes_transferred": len(body),
+        "parse_ms"         : round(parse_seconds * 1000, 4),
+        "peak_memory_bytes": peak_bytes,
+        }
+
+
+def run() -> dict:
+    """Measure the full and the slim fetch."""
+    full_body = json.dumps(onecall_payload()).encode()
+    slim_body = json.dumps(onecall_payload(exclude = exclude_parameter())).encode()
+
+    return {
+        "benchmark": "onecall_fetch",
+        "exclude"  : exclude_parameter(),
+        "before"   : measure(full_body, keep_payload = True),
+        "after"    : measure(slim_body, keep_payload = False),
+        }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent = 4))
@@ -0,0 +1,141 @@
+"""Define realistic One Call payloads for benchmarks and offline runs"""
+import math
+from xml.sax.saxutils import escape
+
+# The One Call API returns this many entries in each block.
+MINUTELY_ENTRIES = 60
+HOURLY_ENTRIES = 48
+DAILY_ENTRIES = 8
+
+
+def weather_condition() -> list:
+    """The "weather" list found in current, hourly and daily entries."""
+    return [{"id": 803, "main": "Clouds", "description": "broken clouds", "icon": "04d"}]
+
+
+def hourly_entry(timestamp: int, temperature: float) -> dict:
+    """One entry of the hourly block, also used for current."""
+    return {
+        "dt"        : timestamp,
+        "temp"      : temperature,
+        "feels_like": round(temperature - 2.35, 2),
+        "pressure"  : 1014,
+        "humidity"  : 62,
+        "dew_point" : round(temperature - 9.1, 2),
+        "uvi"       : 2.41,
+        "clouds"    : 75,
+        "visibility": 10000,
+        "wind_speed": 8.05,
+        "wind_deg"  : 240,
+        "wind_gust" : 14.97,
+        "weather"   : weather_condition(),
+        "pop"       : 0.2,
+        }
+
+
+def daily_entry(timestamp: int, temperature: float) -> dict:
+    """One entry of the daily block."""
+    return {
+        "dt"        : timestamp,
+        "sunrise"   : timestamp - 21600,
+        "sunset"    : timestamp + 21600,
+        "moonrise"  : timestamp - 3600,
+        "moonset"   : timestamp + 30000,
+        "moon_phase": 0.62,
+        "summary"   : "Expect a day of partly cloudy with rain",
+        "temp"      : {
+            "day"  : temperature,
+            "min"  : temperature - 8.5,
+            "max"  : temperature + 4.2,
+            "night": temperature - 6.3,
+            "eve"  : temperature + 1.1,
+            "morn" : temperature - 5.7,
+            },
+        "feels_like": {
+            "day"  : temperature - 2.0,
+            "night": temperature - 8.1,
+            "eve"  : temperature - 0.9,
+            "morn" : temperature - 7.4,
+            },
+        "pressure"  : 1016,
+        "humidity"  : 59,
+        "dew_point" : temperature - 10.2,
+        "wind_speed": 9.3,
+        "wind_deg"  : 250,
+        "wind_gust" : 17.2,
+        "weather"   : weather_condition(),
+        "clouds"    : 68,
+        "pop"       : 0.47,
+        "rain"      : 0.89,
+        "uvi"       : 4.1,
+        }
+
+
+def onecall_payload(exclude: str = "", timestamp: int = 1700000000,
+                    base_temperature: float = 48.3
+                    ) -> dict:
+    """A One Call 3.0 payload shaped like the real thing, without the blocks in exclude."""
+    excluded = set(filter(None, exclude.split(",")))
+
+    def temperature_at(hour: int) -> float:
+        return round(base_temperature + 9 * math.sin(hour * math.pi / 12), 2)
+
+    payload = {
+        "lat"            : 45.0316,
+        "lon"            : -93.0248,
+        "timezone"       : "America/Chicago",
+        "timezone_offset": -21600,
+        }
+
+    if "current" not in excluded:
+        current = hourly_entry(timestamp, temperature_at(0))
+        current.update({"sunrise": timestamp - 21600, "sunset": timestamp + 21600})
+        del current["pop"]
+        payload["current"] = current
+
+    if "minutely" not in excluded:
+        payload["minutely"] = [{"dt": timestamp + 60 * minute, "precipitation": 0}
+                               for minute in range(MINUTELY_ENTRIES)
+                               ]
+
+    if "hourly" not in excluded:
+        payload["hourly"] = [hourly_entry(timestamp + 3600 * hour, temperature_at(hour))
+                             for hour in range(HOURLY_ENTRIES)
+                             ]
+
+    if "daily" not in excluded:
+        payload["daily"] = [daily_entry(timestamp + 86400 * day, temperature_at(day * 24))
+                            for day in range(DAILY_ENTRIES)
+                            ]
+
+    if "alerts" not in excluded:
+        payload["alerts"] = [{
+            "sender_name": "NWS Twin Cities/Chanhassen",
+            "event"      : "Wind Advisory",
+            "start"      : timestamp,
+            "end"        : timestamp + 43200,
+            "description": "* WHAT...Northwest winds 20 to 30 mph with gusts up to 50 mph " * 4,
+            "tags"       : ["Wind"],
+            }]
+
+    return payload
+
+
+def to_xml(tag: str, value) -> str:
+    """Turn a decoded JSON value into XML elements named tag. A list becomes one element per
+    entry."""
+    if isinstance(value, list):
+        return "".join(to_xml(tag, entry) for entry in value)
+
+    if isinstance(value, dict):
+        return "<{0}>{1}</{0}>".format(tag, "".join(to_xml(key, entry)
+                                                     for key, entry in value.items()
+                                                     )
+                                       )
+
+    return "<{0}>{1}</{0}>".format(tag, escape(str(value)))
+
+
+def onecall_xml(payload: dict) -> bytes:
+    """A One Call payload as an XML document, for the XML parsing paths."""
+    return ('<?xml version="1.0" encoding="UTF-8"?>' + to_xml("onecall", payload)).encode()
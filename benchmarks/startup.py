@@ -0,0 +1,101 @@
+"""Benchmark how long main.py takes to put its first frame on the screen after starting.
+
+Every run starts a fresh Python process that runs main.py itself on the headless display, with
+the local stub server as the weather API, and stops it at the first show(). Reports the median
+time to first frame within the process and wall time including starting Python, in milliseconds,
+and which heavy libraries were not loaded yet by the first frame, as JSON."""
+import json
+import os
+import runpy
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 5
+
+# Libraries that should only be loaded after the first frame
+DEFERRED_MODULES = ("requests", "slack_sdk", "xmltodict", "gpiozero", "asyncio")
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FirstFrame(Exception):
+    """Raised from the display's first show() to stop main.py there."""
+
+
+def first_frame() -> dict:
+    """Run main.py in this process until it shows its first frame, and time it. Run in a fresh
+    process by run(), which sets up the headless display and the stub server."""
+    start = time.perf_counter()
+
+    from headless_display import HeadlessDisplay
+
+    def show(display) -> None:
+        raise FirstFrame(time.perf_counter())
+
+    HeadlessDisplay.show = show
+
+    try:
+        runpy.run_path(os.path.join(REPOSITORY_ROOT, "main.py"), run_name = "__main__")
+    except FirstFrame as first:
+        shown = first.args[0]
+    else:
+        raise RuntimeError("main.py stopped without showing a frame")
+
+    return {
+        "first_frame_ms": (shown - start) * 1000,
+        "deferred"      : [module for module in DEFERRED_MODULES if module not in sys.modules],
+        }
+
+
+def run() -> dict:
+    """Time RUNS fresh starts of main.py."""
+    from benchmarks.stub_server import start_stub_server
+    from constants import DISPLAY_BACKEND_VARIABLE, OPENWEATHER_API_KEY
+
+    server = start_stub_server()
+
+    environment = dict(os.environ)
+    environment[DISPLAY_BACKEND_VARIABLE] = "headless"
+    environment["GET_WEATHER_ENDPOINT"] = "http://127.0.0.1:{}/".format(server.server_port)
+    environment.setdefault(OPENWEATHER_API_KEY, "benchmark")
+    environment.setdefault("GPIOZERO_PIN_FACTORY", "mock")
+
+    results = []
+    try:
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--first-frame"],
+                                    cwd = REPOSITORY_ROOT,
+                                    env = environment,
+                                    capture_output = True,
+                                    text = True,
+                                    check = True
+                                    ).stdout
+            wall_ms = (time.perf_counter() - start) * 1000
+
+            # The last line is ours; anything before it was printed while starting up.
+            result = json.loads(output.strip().splitlines()[-1])
+            result["wall_ms"] = wall_ms
+            results.append(result)
+    finally:
+        server.shutdown()
+
+    def median(key: str) -> float:
+        return round(statistics.median(result[key] for result in results), 2)
+
+    return {
+        "benchmark"              : "startup",
+        "runs"                   : RUNS,
+        "first_frame_ms"         : median("first_frame_ms"),
+        "wall_ms"                : median("wall_ms"),
+        "deferred_at_first_frame": results[-1]["deferred"],
+        }
+
+
+if __name__ == "__main__":
+    if "--first-frame" in sys.argv:
+        print(json.dumps(first_frame()))
+    else:
+        print(json.dumps(run(), indent = 4))
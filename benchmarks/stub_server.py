@@ -0,0 +1,290 @@
+"""Define a local One Call stub server, so fetches and the main loop can be run and measured without
+the network or quota
+
+Run it with: python -m benchmarks.stub_server --port 8081 [--schedule 429,503,ok --repeat]
+and point the station at it with GET_WEATHER_ENDPOINT=http://localhost:8081/. Every query gets
+a realistic payload for its lat/lon and units, without the blocks in exclude, as XML with
+mode=xml and as JSON otherwise.
+
+Faults are injected on a schedule, one entry per request, see FAULTS. Every request is recorded
+with its parameters, the fault it got and how long it took; http://localhost:8081/_stub/requests
+returns the records as JSON, and StubServer.records() returns them in the same process."""
+import argparse
+import json
+import select
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from benchmarks.payloads import onecall_payload, onecall_xml
+
+# Roughly the same weather in each unit system
+BASE_TEMPERATURES = {
+    "metric"  : 9.0,
+    "imperial": 48.3,
+    "standard": 282.2,
+    }
+
+# What the stub can do with a request. Any 5xx status code can be used as well, e.g. "503".
+FAULTS = {
+    "ok"      : "answer normally",
+    "slow"    : "answer normally after slow_seconds",
+    "429"     : "Too Many Requests, with a Retry-After header",
+    "truncate": "send the full Content-Length but only half the body, then hang up",
+    "xml"     : "answer with XML whatever mode was asked for",
+    "stall"   : "accept the request and never answer, until the client hangs up or stall_seconds",
+    }
+
+# Where the records are served; these requests are not recorded themselves
+RECORDS_PATH = "/_stub/requests"
+
+
+def is_fault(fault: str) -> bool:
+    return fault in FAULTS or (fault.isdigit() and 500 <= int(fault) <= 599)
+
+
+def parse_schedule(schedule: str) -> list:
+    """Turn a comma separated schedule such as "429,503,ok" into a list of faults."""
+    faults = [fault.strip().lower() for fault in schedule.split(",") if fault.strip()]
+
+    for fault in faults:
+        if not is_fault(fault):
+            raise ValueError(f"Unknown fault '{fault}', expected one of {', '.join(FAULTS)} or 5xx")
+
+    return faults
+
+
+class FaultSchedule:
+    """Hands out one fault per request, in order. Once the schedule runs out it starts over if
+    repeat = True, and answers normally otherwise."""
+
+    def __init__(self, faults = (), repeat: bool = False) -> None:
+        if isinstance(faults, str):
+            faults = parse_schedule(faults)
+
+        for fault in faults:
+            if not is_fault(fault):
+                raise ValueError(f"Unknown fault '{fault}'")
+
+        self.faults = list(faults)
+        self.repeat = repeat
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def next(self) -> str:
+        with self.lock:
+            if not self.faults or (self.position >= len(self.faults) and not self.repeat):
+                return "ok"
+
+            fault = self.faults[self.position % len(self.faults)]
+            self.position += 1
+            return fault
+
+
+def stub_response(params: dict) -> tuple:
+    """The (content type, body) the stub answers a One Call query with."""
+    payload = onecall_payload(
+        exclude = params.get("exclude", ""),
+        base_temperature = BASE_TEMPERATURES.get(params.get("units"), BASE_TEMPERATURES["standard"])
+        )
+
+    try:
+        payload["lat"] = float(params["lat"])
+        payload["lon"] = float(params["lon"])
+    except (KeyError, ValueError):
+        pass
+
+    if params.get("mode") == "xml":
+        return "application/xml", onecall_xml(payload)
+    return "application/json", json.dumps(payload).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answer every GET with a One Call payload, or with the next fault of the schedule."""
+    protocol_version = "HTTP/1.1"
+
+    # The headers and the body are written separately; don't let Nagle hold the body back.
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == RECORDS_PATH:
+            self.send_body(200, "application/json", json.dumps(self.server.records()).encode())
+            return
+
+        params = dict(parse_qsl(url.query))
+        fault = self.server.schedule.next()
+        record = self.server.record(self.path, params, fault)
+        start = time.monotonic()
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if fault == "stall":
+            record["client_closed_after"] = self.wait_for_hangup(self.server.stall_seconds)
+            self.close_connection = True
+
+        elif fault == "429" or fault.isdigit():
+            record["status"] = int(fault)
+            headers = {}
+            if fault == "429":
+                headers["Retry-After"] = str(self.server.retry_after)
+
+            # The same kind of error body OpenWeather sends
+            body = json.dumps({"cod": int(fault), "message": FAULTS.get(fault, "Server error")})
+            self.send_body(int(fault), "application/json", body.encode(), headers)
+
+        else:
+            if fault == "slow":
+                time.sleep(self.server.slow_seconds)
+
+            if fault == "xml":
+                params["mode"] = "xml"
+
+            content_type, body = stub_response(params)
+            record["status"] = 200
+
+            if fault == "truncate":
+                self.send_body(200, content_type, body, body_bytes = len(body) // 2)
+                self.close_connection = True
+            else:
+                self.send_body(200, content_type, body)
+
+        record["seconds"] = time.monotonic() - start
+
+    def send_body(self, status: int, content_type: str, body: bytes, headers: dict = None,
+                  body_bytes: int = None) -> None:
+        """Send a response. If body_bytes is given, only that much of the body is sent, though the
+        Content-Length is still that of the whole body."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body[:body_bytes])
+
+    def wait_for_hangup(self, seconds: float):
+        """Keep the connection open without answering for up to seconds. Returns how long it took
+        the client to hang up, or None if it never did."""
+        start = time.monotonic()
+
+        while time.monotonic() - start < seconds:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                try:
+                    if not self.connection.recv(4096):
+                        return time.monotonic() - start
+                except ConnectionError:
+                    return time.monotonic() - start
+
+        return None
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StubServer(ThreadingHTTPServer):
+    """A threaded HTTP server for StubHandler, with the fault schedule and the records."""
+    daemon_threads = True
+
+    def __init__(self,
+                 address: tuple,
+                 verbose: bool = False,
+                 schedule: FaultSchedule = None,
+                 latency: float = 0.0,
+                 slow_seconds: float = 5.0,
+                 stall_seconds: float = 60.0,
+                 retry_after: int = 1
+                 ) -> None:
+        super().__init__(address, StubHandler)
+        self.verbose = verbose
+        self.schedule = schedule or FaultSchedule()
+        self.latency = latency
+        self.slow_seconds = slow_seconds
+        self.stall_seconds = stall_seconds
+        self.retry_after = retry_after
+        self.recorded = []
+        self.records_lock = threading.Lock()
+
+    def record(self, path: str, params: dict, fault: str) -> dict:
+        """Record a request as it comes in; the handler fills in the rest as it answers."""
+        record = {
+            "number": None,
+            "time"  : time.time(),
+            "path"  : path,
+            "params": dict(params),
+            "fault" : fault,
+            "status": None,
+            }
+        with self.records_lock:
+            record["number"] = len(self.recorded) + 1
+            self.recorded.append(record)
+        return record
+
+    def records(self) -> list:
+        """Copies of the records of every request so far, oldest first."""
+        with self.records_lock:
+            return [dict(record) for record in self.recorded]
+
+    def reset(self, schedule: FaultSchedule = None) -> None:
+        """Forget the records, and start a new schedule if one is given."""
+        with self.records_lock:
+            self.recorded = []
+        if schedule is not None:
+            self.schedule = schedule
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients hang up early on purpose, e.g. once the XML paths they want are found.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, verbose: bool = False,
+                      **options) -> StubServer:
+    """Start the stub on a background thread and return the server. Port 0 picks a free port;
+    the URL to call is http://host:server.server_port/. Other keyword arguments are passed on to
+    StubServer, e.g. schedule = FaultSchedule("429,ok"). Stop it with shutdown()."""
+    server = StubServer((host, port), verbose, **options)
+    threading.Thread(target = server.serve_forever, name = "stub-server", daemon = True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description = "Local One Call stub server",
+        epilog = "Faults: " + "; ".join(f"{name}: {what}" for name, what in FAULTS.items())
+        )
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8081)
+    parser.add_argument("--schedule", default = "",
+                        help = "Comma separated faults for the next requests, e.g. 429,503,ok"
+                        )
+    parser.add_argument("--repeat", action = "store_true", help = "Start the schedule over")
+    parser.add_argument("--latency", type = float, default = 0.0,
+                        help = "Seconds to wait before every answer"
+                        )
+    parser.add_argument("--slow-seconds", type = float, default = 5.0)
+    parser.add_argument("--stall-seconds", type = float, default = 60.0)
+    parser.add_argument("--retry-after", type = int, default = 1)
+    parser.add_argument("--verbose", action = "store_true")
+    arguments = parser.parse_args()
+
+    try:
+        stub_schedule = FaultSchedule(arguments.schedule, arguments.repeat)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stub = StubServer((arguments.host, arguments.port),
+                      verbose = arguments.verbose,
+                      schedule = stub_schedule,
+                      latency = arguments.latency,
+                      slow_seconds = arguments.slow_seconds,
+                      stall_seconds = arguments.stall_seconds,
+                      retry_after = arguments.retry_after
+                      )
+    print(f"stub_server: serving on http://{arguments.host}:{stub.server_port}/")
+    stub.serve_forever()
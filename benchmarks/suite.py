@@ -0,0 +1,248 @@
+"""Benchmark the render and fetch hot paths, on the headless display and against the local stub
+server, so no hardware, network or API quota is needed.
+
+Measures display_number and clear_section throughput, the latency of a full three-row refresh,
+api_call_to_json end to end for JSON and XML, parsing on its own, and the time to the first frame.
+Prints one JSON document with the commit and machine it ran on, so results from the Pi and from
+x86 can be compared between commits. Run it with: python -m benchmarks.suite [--output file]
+[--skip-startup]"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+from benchmarks import startup
+from benchmarks.payloads import onecall_payload
+from benchmarks.stub_server import start_stub_server, stub_response
+from constants import DISPLAY_BACKEND_VARIABLE
+from functions import (animation_clock, api_call_to_json, clear_section, display_number, flush,
+                       framebuffer, parse_xml_paths, XML_CHUNK_SIZE
+                       )
+from layout import render_forecast
+from weather import exclude_parameter, extract_forecast
+
+FRAMES = 500
+FETCHES = 50
+PARSES = 200
+
+# Readings from the current block, near the start of the document, so the streaming parser stops
+# early. The hourly readings on the screen can't be asked for, since parse_xml_paths() can't pick
+# an entry of a list.
+XML_PATHS = ("current/feels_like", "current/humidity", "current/uvi")
+
+
+def timings(samples: list) -> dict:
+    """Median and 95th percentile of samples in seconds, in milliseconds."""
+    samples = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "p95_ms"   : round(samples[int(len(samples) * 0.95) - 1] * 1000, 4),
+        }
+
+
+def throughput(name: str, draw, frames: int = FRAMES) -> dict:
+    """Call draw(frame) for every frame and flush after each, counting what reached the display."""
+    framebuffer.clear()
+    flush(force = True)
+    framebuffer.report()
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        draw(frame)
+        flush()
+    seconds = time.perf_counter() - start
+
+    stats = framebuffer.report()
+    return {
+        "benchmark"        : name,
+        "frames"           : frames,
+        "frames_per_s"     : round(frames / seconds, 1),
+        "pixels_per_s"     : round(stats["pixels_written"] / seconds, 1),
+        "flushes_per_frame": round(stats["flushes"] / frames, 3),
+        "pixels_per_frame" : round(stats["pixels_written"] / frames, 2),
+        }
+
+
+def draw_digit(frame: int) -> None:
+    display_number(frame % 10, 0, 0, clear = True, animate = False)
+
+
+def draw_digit_animated(frame: int) -> None:
+    display_number(frame % 10, 0, 0, clear = True, animate = True)
+
+
+def clear_row(frame: int) -> None:
+    # Fill a row so every clear has something to blank.
+    display_number(frame % 10, 0, 0, animate = False)
+    flush()
+    clear_section(0, 5, 0, 6)
+
+
+def render_benchmarks() -> list:
+    """Throughput of drawing digits and clearing rows, and latency of a full three-row refresh."""
+    results = [throughput("display_number", draw_digit),
+               throughput("clear_section", clear_row),
+               ]
+
+    # The stroke by stroke animation, without waiting between strokes.
+    animation_clock.sleep = lambda: None
+    try:
+        results.append(throughput("display_number_animated", draw_digit_animated, FRAMES // 10))
+    finally:
+        del animation_clock.sleep
+
+    # Alternate between two forecasts, so every refresh changes the screen.
+    forecasts = [extract_forecast(onecall_payload(base_temperature = temperature))
+                 for temperature in (9.0, 21.0)
+                 ]
+    samples = []
+    framebuffer.report()
+    for frame in range(FRAMES):
+        start = time.perf_counter()
+        render_forecast(framebuffer.pixels, forecasts[frame % 2])
+        flush()
+        samples.append(time.perf_counter() - start)
+
+    stats = framebuffer.report()
+    results.append(dict({"benchmark"        : "three_row_refresh",
+                         "frames"           : FRAMES,
+                         "flushes_per_frame": round(stats["flushes"] / FRAMES, 3),
+                         "pixels_per_frame" : round(stats["pixels_written"] / FRAMES, 2),
+                         },
+                        **timings(samples)
+                        ))
+    return results
+
+
+def fetch_benchmarks(url: str) -> list:
+    """api_call_to_json end to end against the stub, for JSON, XML through the streaming parser
+    and XML converted whole."""
+    params = {
+        "lat"    : 40.71,
+        "lon"    : -74.01,
+        "units"  : "metric",
+        "exclude": exclude_parameter(),
+        }
+    cases = (
+        ("api_call_to_json_json", params, None),
+        ("api_call_to_json_xml_paths", dict(params, mode = "xml"), XML_PATHS),
+        ("api_call_to_json_xml", dict(params, mode = "xml"), None),
+        )
+
+    results = []
+    for name, case_params, xml_paths in cases:
+        samples = []
+        for _ in range(FETCHES):
+            start = time.perf_counter()
+            result, _ = api_call_to_json(method = "GET",
+                                         name = name,
+                                         url = url,
+                                         api_calls = 0,
+                                         params = case_params,
+                                         xml_paths = xml_paths
+                                         )
+            samples.append(time.perf_counter() - start)
+
+            if result["result"] != "success":
+                raise RuntimeError(f"{name} failed: {result.get('error')}")
+
+        _, body = stub_response(case_params)
+        results.append(dict({"benchmark": name, "calls": FETCHES, "bytes": len(body)},
+                            **timings(samples)
+                            ))
+    return results
+
+
+def parse_benchmarks() -> list:
+    """Parsing the recorded payload on its own, without the HTTP round trip."""
+    import xmltodict
+
+    params = {"units": "metric", "exclude": exclude_parameter()}
+    _, json_body = stub_response(params)
+    _, xml_body = stub_response(dict(params, mode = "xml"))
+
+    def xml_chunks() -> list:
+        return [xml_body[i:i + XML_CHUNK_SIZE] for i in range(0, len(xml_body), XML_CHUNK_SIZE)]
+
+    cases = (
+        ("parse_json", len(json_body), lambda: extract_forecast(json.loads(json_body))),
+        ("parse_xml_paths", len(xml_body), lambda: parse_xml_paths(xml_chunks(), XML_PATHS)),
+        ("parse_xmltodict", len(xml_body), lambda: xmltodict.parse(xml_body)),
+        )
+
+    results = []
+    for name, size, parse in cases:
+        samples = []
+        for _ in range(PARSES):
+            start = time.perf_counter()
+            parse()
+            samples.append(time.perf_counter() - start)
+
+        results.append(dict({"benchmark": name, "runs": PARSES, "bytes": size},
+                            **timings(samples)
+                            ))
+    return results
+
+
+def environment() -> dict:
+    """What the results were measured on."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"],
+                                cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                capture_output = True,
+                                text = True,
+                                check = True
+                                ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit"   : commit,
+        "machine"  : platform.machine(),
+        "platform" : platform.platform(),
+        "python"   : platform.python_version(),
+        "display"  : os.environ.get(DISPLAY_BACKEND_VARIABLE),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+
+
+def run(skip_startup: bool = False) -> dict:
+    """Run every benchmark. The display is only opened on first use, so unless another one was
+    asked for, everything is drawn on the headless display."""
+    os.environ.setdefault(DISPLAY_BACKEND_VARIABLE, "headless")
+
+    server = start_stub_server()
+    try:
+        url = "http://127.0.0.1:{}/".format(server.server_port)
+        results = render_benchmarks() + fetch_benchmarks(url) + parse_benchmarks()
+    finally:
+        server.shutdown()
+
+    if not skip_startup:
+        results.append(startup.run())
+
+    return {
+        "suite"      : "weather_station",
+        "environment": environment(),
+        "results"    : results,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the render and fetch hot paths")
+    parser.add_argument("--output", help = "Also write the results to this JSON file")
+    parser.add_argument("--skip-startup", action = "store_true",
+                        help = "Leave out the startup benchmark, which starts Python 5 times"
+                        )
+    arguments = parser.parse_args()
+
+    report = run(arguments.skip_startup)
+    print(json.dumps(report, indent = 4))
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(report, output_file, indent = 4)
@@ -0,0 +1,142 @@
+"""Define the button input: presses are debounced and queued for the main loop to wait on"""
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from constants import BUTTON_BOUNCE_TIME, BUTTON_HOLD_TIME
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Appended to a button's name for a long press, e.g. "Y_HELD"
+HELD = "_HELD"
+
+
+def make_button(button):
+    """A gpiozero Button on the given GPIO pin. gpiozero is only imported once the first one is
+    created, so the program can show something before it has loaded."""
+    if not isinstance(button, int):
+        return button
+
+    from gpiozero import Button
+
+    return Button(button)
+
+
+class ButtonEvents:
+    """Turn gpiozero button presses into a thread-safe queue of button names.
+
+    gpiozero calls when_pressed from its own thread; the main loop blocks on wait() instead of
+    polling, so it sleeps until a button is pressed or its timeout runs out.
+
+    buttons maps names to gpiozero Buttons, or to GPIO pin numbers to create them on. The buttons
+    named in holdable also report long presses, as their name followed by HELD. Their
+    short presses are only reported when released, so a long press isn't also a short one."""
+
+    def __init__(self, buttons: dict, bounce_time: float = BUTTON_BOUNCE_TIME,
+                 holdable: tuple = (), hold_time: float = BUTTON_HOLD_TIME
+                 ) -> None:
+        self.buttons = {name: make_button(button) for name, button in buttons.items()}
+        self.bounce_time = bounce_time
+        self.events = queue.Queue()
+        self.last_pressed = {}
+        self.held = set()
+        self.lock = threading.Lock()
+
+        for name, button in self.buttons.items():
+            if name in holdable:
+                button.hold_time = hold_time
+                button.when_held = self.hold_handler(name)
+                button.when_released = self.release_handler(name)
+            else:
+                button.when_pressed = self.handler(name)
+
+    def handler(self, name: str):
+        """The when_pressed callback for one button."""
+        def pressed() -> None:
+            self.press(name)
+        return pressed
+
+    def hold_handler(self, name: str):
+        """The when_held callback for one button."""
+        def held() -> None:
+            with self.lock:
+                self.held.add(name)
+            self.deliver(name + HELD)
+        return held
+
+    def release_handler(self, name: str):
+        """The when_released callback for one button: a short press, unless it was held."""
+        def released() -> None:
+            with self.lock:
+                was_held = name in self.held
+                self.held.discard(name)
+            if not was_held:
+                self.press(name)
+        return released
+
+    def press(self, name: str) -> bool:
+        """Queue a press of the named button, unless it bounced. Returns True if it was queued."""
+        now = time.monotonic()
+
+        with self.lock:
+            last_pressed = self.last_pressed.get(name)
+            if last_pressed is not None and now - last_pressed < self.bounce_time:
+                return False
+            self.last_pressed[name] = now
+
+        self.deliver(name)
+        return True
+
+    def deliver(self, name: str) -> None:
+        """Hand a debounced press over to whoever is waiting for it."""
+        self.events.put(name)
+
+    def wait(self, timeout: float = None):
+        """Block until a button is pressed and return its name, or None once timeout seconds have
+        passed without a press. timeout = None waits forever."""
+        if timeout is not None and timeout <= 0:
+            return self.poll()
+
+        try:
+            return self.events.get(timeout = timeout)
+        except queue.Empty:
+            return None
+
+    def poll(self):
+        """Return the next queued press without waiting, or None."""
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        """Stop listening to the buttons."""
+        for button in self.buttons.values():
+            button.when_pressed = None
+            button.when_held = None
+            button.when_released = None
+
+
+class AsyncButtonEvents(ButtonEvents):
+    """ButtonEvents for asyncio: presses are handed over to the event loop instead of a queue."""
+
+    def __init__(self, buttons: dict, loop: "asyncio.AbstractEventLoop",
+                 bounce_time: float = BUTTON_BOUNCE_TIME, holdable: tuple = (),
+                 hold_time: float = BUTTON_HOLD_TIME
+                 ) -> None:
+        # Only the asyncio entry point needs asyncio, so it isn't loaded before the first frame.
+        import asyncio
+
+        self.loop = loop
+        self.async_events = asyncio.Queue()
+        super().__init__(buttons, bounce_time, holdable, hold_time)
+
+    def deliver(self, name: str) -> None:
+        """Queue a debounced press on the event loop, from gpiozero's thread."""
+        self.loop.call_soon_threadsafe(self.async_events.put_nowait, name)
+
+    async def next_press(self) -> str:
+        """Wait for the next button press and return the button's name."""
+        return await self.async_events.get()
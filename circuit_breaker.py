@@ -0,0 +1,98 @@
+"""Define the circuit breaker that spaces out retries while the weather API keeps failing"""
+import time
+
+from constants import (CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                       CIRCUIT_BREAKER_RESET_TIMEOUT,
+                       CIRCUIT_BREAKER_MAX_RESET_TIMEOUT)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Stop calling an API for a while after too many consecutive failures.
+
+    closed:    calls go through. After failure_threshold failures in a row, the breaker opens.
+    open:      calls are refused until the reset timeout has passed, then one trial call is let
+               through (half-open).
+    half-open: a success closes the breaker again; a failure opens it for twice as long, up to
+               max_reset_timeout."""
+
+    def __init__(self,
+                 failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_BREAKER_RESET_TIMEOUT,
+                 max_reset_timeout: float = CIRCUIT_BREAKER_MAX_RESET_TIMEOUT
+                 ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.open_timeout = reset_timeout
+        self.last_failure_at = None
+        self.last_error = None
+
+    def allow_request(self) -> bool:
+        """True if a call may be made now. Moves an open breaker to half-open once its timeout
+        has passed."""
+        if self.state == OPEN and self.seconds_until_retry() == 0:
+            self.state = HALF_OPEN
+            print("circuit_breaker: half-open, trying the API again")
+
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        """A call succeeded: close the breaker."""
+        if self.state != CLOSED:
+            print(f"circuit_breaker: closed again after {self.consecutive_failures} failures")
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.open_timeout = self.reset_timeout
+        self.last_error = None
+
+    def record_failure(self, error: str = None) -> None:
+        """A call failed: open the breaker if there have been too many failures in a row."""
+        now = time.monotonic()
+        self.consecutive_failures += 1
+        self.last_failure_at = now
+        self.last_error = error
+
+        if self.state == HALF_OPEN:
+            self.open_timeout = min(self.open_timeout * 2, self.max_reset_timeout)
+
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+            print("circuit_breaker: open after {} failures, next try in {:.0f}s".format(
+                self.consecutive_failures, self.open_timeout
+                )
+                )
+
+    def seconds_until_retry(self) -> float:
+        """How long until the next call should be tried. 0 if it can be tried now."""
+        now = time.monotonic()
+
+        if self.state == OPEN:
+            return max(self.opened_at + self.open_timeout - now, 0.0)
+
+        if self.consecutive_failures and self.last_failure_at is not None:
+            return max(self.last_failure_at + self.reset_timeout - now, 0.0)
+
+        return 0.0
+
+    def status(self, data_fetched_at: float = None) -> dict:
+        """The breaker's state for logs and metrics. data_fetched_at is the wall clock time the
+        data on screen was fetched, if known."""
+        return {
+            "state"               : self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error"          : self.last_error,
+            "seconds_until_retry" : round(self.seconds_until_retry(), 1),
+            "data_age_seconds"    : (None if data_fetched_at is None
+                                     else round(time.time() - data_fetched_at, 1)),
+            }
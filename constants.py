@@ -1,5 +1,5 @@
 """Define the constants used in this project"""
-from gpiozero import Button
+import os
 
 from adjustable_settings import LANGUAGE
 
@@ -11,9 +11,68 @@ SLACK_API_KEY = "CARAVAN_BOT_SLACK_CLIENT"
 MOCK_SLACK_CHANNEL = "#kinghadiofthecaravan-logs"
 
 # OpenWeatherAPI
-GET_WEATHER_ENDPOINT = "https://api.openweathermap.org/data/3.0/onecall"
+# Forecasts are always fetched and saved in these units, and converted locally for display.
+CANONICAL_UNITS = "metric"
+OPENWEATHER_ENDPOINT = "https://api.openweathermap.org/data/3.0/onecall"
 OPENWEATHER_API_KEY = "OPENWEATHER_API_KEY"
 
+# Set GET_WEATHER_ENDPOINT in the environment to fetch through a weather_proxy.py instead.
+GET_WEATHER_ENDPOINT = os.environ.get("GET_WEATHER_ENDPOINT", OPENWEATHER_ENDPOINT)
+
+# weather_proxy.py keeps a response for PROXY_CACHE_TTL seconds, for every station within
+# PROXY_COORDINATE_PRECISION decimal places of latitude and longitude (2 is roughly 1 km).
+PROXY_CACHE_TTL = 240
+PROXY_COORDINATE_PRECISION = 2
+
+# HTTP connection settings, in seconds. A stalled connection gives up after these.
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 15
+HTTP_POOL_SIZE = 4
+
+# Retrying failed API calls: the wait doubles every attempt, up to RETRY_MAX_DELAY seconds.
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# OpenWeather's free One Call allowance, shared by everything that calls it.
+OPENWEATHER_DAILY_QUOTA = 1000
+OPENWEATHER_BURST_SIZE = 20
+
+# After this many failed fetches in a row, wait before trying again. The wait doubles after every
+# failed try, up to the maximum, in seconds.
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+CIRCUIT_BREAKER_MAX_RESET_TIMEOUT = 1800
+
+# With several locations, at most this many forecasts are fetched at the same time.
+LOCATION_FETCH_WORKERS = 4
+
+# The asyncio main loop starts fetching the forecast this many seconds before it is due.
+PREFETCH_LEAD_TIME = 15
+
+# main_split.py: the fetcher process checks in at least this often, in seconds, and is restarted
+# if it hasn't for FETCHER_STALL_TIMEOUT seconds.
+FETCHER_HEARTBEAT_INTERVAL = 30
+FETCHER_STALL_TIMEOUT = 600
+
+# How often, in seconds, adjustable_settings.py is checked for changes while running.
+SETTINGS_CHECK_INTERVAL = 5
+
+# Set this environment variable to "headless" to draw into memory instead of on the Unicorn Hat
+# Mini, e.g. to run main.py in tests or benchmarks.
+DISPLAY_BACKEND_VARIABLE = "WEATHER_STATION_DISPLAY"
+
+# Each startup self-test pattern stays on screen this long, in seconds.
+SELF_TEST_FRAME_TIME = 0.04
+
+# Changes on every boot. The last one the self-test ran on is kept in BOOT_MARKER_PATH.
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+BOOT_MARKER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".last_boot_id")
+
+# The last good forecast is kept here, so a restart can show it without waiting for the network.
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather_snapshot.json")
+
 COLORS = {
     "white"  : (220, 220, 220),
     "aqua"   : (0, 255, 255),
@@ -24,6 +83,22 @@ COLORS = {
     "fuchsia": (255, 0, 255),
     }
 
+# Colours used for the temperatures on each row
+COLOR_SCHEMES = {
+    "default": {
+        "positive": COLORS["white"],
+        "negative": COLORS["red"],
+        "error"   : COLORS["red"],
+        },
+
+    # Dimmed, for the last good forecast while the API can't be reached
+    "stale"  : {
+        "positive": (90, 90, 90),
+        "negative": (110, 0, 0),
+        "error"   : COLORS["red"],
+        },
+    }
+
 MAX_NUMBER = 17
 
 # Unicorn Hat Mini Button Mappings
@@ -38,258 +113,272 @@ MAX_NUMBER = 17
 # |         |
 # |_________|
 #  Y       X
+#
+# These are the GPIO pins; the gpiozero Buttons are only created when ButtonEvents starts
+# listening to them.
 
-BUTTON_B = Button(6)
-BUTTON_A = Button(5)
-BUTTON_Y = Button(24)
-BUTTON_X = Button(16)
+BUTTON_B = 6
+BUTTON_A = 5
+BUTTON_Y = 24
+BUTTON_X = 16
+
+# Presses of the same button closer together than this, in seconds, are treated as one.
+BUTTON_BOUNCE_TIME = 0.2
+
+# Holding a button down for this many seconds counts as a long press.
+BUTTON_HOLD_TIME = 1
 
 # Numbers to Draw
 # This is aligned to the top and left
 # The coordinates are ordered in a way that emulates the way a human would draw the number.
-if LANGUAGE == "English":
-    NUMBERS_TO_DRAW = {
-        0: (
-            (0, 6),  # | * * * |
-            (0, 5),  # | *   * |
-            (0, 4),  # | *   * |
-            (1, 4),  # | *   * |
-            (2, 4),  # | * * * |
-            (3, 4),
-            (4, 4),
-            (4, 5),
-            (4, 6),
-            (3, 6),
-            (2, 6),
-            (1, 6),
-            ),
-
-        1: (
-            (1, 6),  # |   *   |
-            (0, 5),  # | * *   |
-            (1, 5),  # |   *   |
-            (2, 5),  # |   *   |
-            (3, 5),  # | * * * |
-            (4, 5),
-            (4, 6),
-            (4, 4),
-            ),
-
-        2: (
-            (0, 6),  # | * * * |
-            (0, 5),  # |     * |
-            (0, 4),  # | * * * |
-            (1, 4),  # | *     |
-            (2, 4),  # | * * * |
-            (2, 5),
-            (2, 6),
-            (3, 6),
-            (4, 6),
-            (4, 5),
-            (4, 4),
-            ),
-
-        3: (
-            (0, 6),  # | * * * |
-            (0, 5),  # |     * |
-            (0, 4),  # | * * * |
-            (1, 4),  # |     * |
-            (2, 4),  # | * * * |
-            (2, 5),
-            (2, 6),
-            (3, 4),
-            (4, 4),
-            (4, 5),
-            (4, 6),
-            ),
-
-        4: (
-            (0, 6),  # | *   * |
-            (1, 6),  # | *   * |
-            (2, 6),  # | * * * |
-            (2, 5),  # |     * |
-            (0, 4),  # |     * |
-            (1, 4),
-            (2, 4),
-            (3, 4),
-            (4, 4),
-            ),
-
-        5: (
-            (0, 4),  # | * * * |
-            (0, 5),  # | *     |
-            (0, 6),  # | * * * |
-            (1, 6),  # |     * |
-            (2, 6),  # | * * * |
-            (2, 5),
-            (2, 4),
-            (3, 4),
-            (4, 4),
-            (4, 5),
-            (4, 6),
-            ),
-
-        6: (
-            (0, 4),  # | * * * |
-            (0, 5),  # | *     |
-            (0, 6),  # | * * * |
-            (1, 6),  # | *   * |
-            (2, 6),  # | * * * |
-            (3, 6),
-            (4, 6),
-            (4, 5),
-            (4, 4),
-            (3, 4),
-            (2, 4),
-            (2, 5),
-            ),
-
-        7: (
-            (0, 6),  # | * * * |
-            (0, 5),  # |     * |
-            (0, 4),  # |     * |
-            (1, 4),  # |     * |
-            (2, 4),  # |     * |
-            (3, 4),
-            (4, 4),
-            ),
-
-        8: (
-            (1, 6),  # | * * * |
-            (0, 6),  # | *   * |
-            (0, 5),  # | * * * |
-            (0, 4),  # | *   * |
-            (1, 4),  # | * * * |
-            (2, 4),
-            (2, 5),
-            (2, 6),
-            (3, 6),
-            (4, 6),
-            (4, 5),
-            (4, 4),
-            (3, 4),
-            ),
-
-        9: (
-            (2, 5),  # | * * * |
-            (2, 6),  # | *   * |
-            (1, 6),  # | * * * |
-            (0, 6),  # |     * |
-            (0, 5),  # | * * * |
-            (0, 4),
-            (1, 4),
-            (2, 4),
-            (3, 4),
-            (4, 4),
-            (4, 5),
-            (4, 6),
-            )
-        }
-
-elif LANGUAGE == "Arabic":
-    NUMBERS_TO_DRAW = {
-        0: (
-            (4, 5),  # |   *   |
-            ),
-
-        1: (
-            (0, 5),  # |   *   |
-            (1, 4),  # |   *   |
-            (2, 4),  # |   *   |
-            (3, 4),  # |   *   |
-            (4, 4),  # |   *   |
-            ),
-
-        2: (
-            (0, 4),  # |   * * |
-            (0, 5),  # | *     |
-            (1, 6),  # | *     |
-            (2, 6),  # |   *   |
-            (3, 5),  # |     * |
-            (4, 4),
-            ),
-
-        3: (
-            (0, 4),  # | *   *  |
-            (1, 4),  # | * * *  |
-            (1, 5),  # | *      |
-            (0, 6),  # | *      |
-            (1, 6),  # | *      |
-            (2, 6),
-            (3, 6),
-            (4, 6),
-            ),
-
-        4: (
-            (0, 4),  # |   * * |
-            (0, 5),  # | *     |
-            (1, 6),  # |   * * |
-            (2, 4),  # | *     |
-            (2, 5),  # |   * * |
-            (3, 6),
-            (4, 5),
-            (4, 4),
-            ),
-
-        5: (
-            (3, 6),  # |       |
-            (2, 6),  # |   *   |
-            (1, 5),  # | *   * |
-            (2, 4),  # | *   * |
-            (3, 4),  # | * * * |
-            (4, 4),
-            (4, 5),
-            (4, 6),
-            ),
-
-        6: (
-            (0, 6),  # | * * * |
-            (0, 5),  # |     * |
-            (0, 4),  # |     * |
-            (1, 4),  # |     * |
-            (2, 4),  # |     * |
-            (3, 4),
-            (4, 4),
-            ),
-
-        7: (
-            (0, 6),  # | *   * |
-            (1, 6),  # | *   * |
-            (2, 6),  # | *   * |
-            (3, 6),  # | *   * |
-            (4, 5),  # |   *   |
-            (3, 4),
-            (2, 4),
-            (1, 4),
-            (0, 4),
-            ),
-
-        8: (
-            (4, 6),  # |   *   |
-            (3, 6),  # | *   * |
-            (2, 6),  # | *   * |
-            (1, 6),  # | *   * |
-            (0, 5),  # | *   * |
-            (1, 4),
-            (2, 4),
-            (3, 4),
-            (4, 4),
-            ),
-
-        9: (
-            (0, 4),  # | * * * |
-            (0, 5),  # | *   * |
-            (0, 6),  # | * * * |
-            (1, 6),  # |     * |
-            (2, 6),  # |     * |
-            (2, 5),
-            (1, 4),
-            (2, 4),
-            (3, 4),
-            (4, 4),
-            )
-        }
-
-else:
+ENGLISH_NUMBERS_TO_DRAW = {
+    0: (
+        (0, 6),  # | * * * |
+        (0, 5),  # | *   * |
+        (0, 4),  # | *   * |
+        (1, 4),  # | *   * |
+        (2, 4),  # | * * * |
+        (3, 4),
+        (4, 4),
+        (4, 5),
+        (4, 6),
+        (3, 6),
+        (2, 6),
+        (1, 6),
+        ),
+
+    1: (
+        (1, 6),  # |   *   |
+        (0, 5),  # | * *   |
+        (1, 5),  # |   *   |
+        (2, 5),  # |   *   |
+        (3, 5),  # | * * * |
+        (4, 5),
+        (4, 6),
+        (4, 4),
+        ),
+
+    2: (
+        (0, 6),  # | * * * |
+        (0, 5),  # |     * |
+        (0, 4),  # | * * * |
+        (1, 4),  # | *     |
+        (2, 4),  # | * * * |
+        (2, 5),
+        (2, 6),
+        (3, 6),
+        (4, 6),
+        (4, 5),
+        (4, 4),
+        ),
+
+    3: (
+        (0, 6),  # | * * * |
+        (0, 5),  # |     * |
+        (0, 4),  # | * * * |
+        (1, 4),  # |     * |
+        (2, 4),  # | * * * |
+        (2, 5),
+        (2, 6),
+        (3, 4),
+        (4, 4),
+        (4, 5),
+        (4, 6),
+        ),
+
+    4: (
+        (0, 6),  # | *   * |
+        (1, 6),  # | *   * |
+        (2, 6),  # | * * * |
+        (2, 5),  # |     * |
+        (0, 4),  # |     * |
+        (1, 4),
+        (2, 4),
+        (3, 4),
+        (4, 4),
+        ),
+
+    5: (
+        (0, 4),  # | * * * |
+        (0, 5),  # | *     |
+        (0, 6),  # | * * * |
+        (1, 6),  # |     * |
+        (2, 6),  # | * * * |
+        (2, 5),
+        (2, 4),
+        (3, 4),
+        (4, 4),
+        (4, 5),
+        (4, 6),
+        ),
+
+    6: (
+        (0, 4),  # | * * * |
+        (0, 5),  # | *     |
+        (0, 6),  # | * * * |
+        (1, 6),  # | *   * |
+        (2, 6),  # | * * * |
+        (3, 6),
+        (4, 6),
+        (4, 5),
+        (4, 4),
+        (3, 4),
+        (2, 4),
+        (2, 5),
+        ),
+
+    7: (
+        (0, 6),  # | * * * |
+        (0, 5),  # |     * |
+        (0, 4),  # |     * |
+        (1, 4),  # |     * |
+        (2, 4),  # |     * |
+        (3, 4),
+        (4, 4),
+        ),
+
+    8: (
+        (1, 6),  # | * * * |
+        (0, 6),  # | *   * |
+        (0, 5),  # | * * * |
+        (0, 4),  # | *   * |
+        (1, 4),  # | * * * |
+        (2, 4),
+        (2, 5),
+        (2, 6),
+        (3, 6),
+        (4, 6),
+        (4, 5),
+        (4, 4),
+        (3, 4),
+        ),
+
+    9: (
+        (2, 5),  # | * * * |
+        (2, 6),  # | *   * |
+        (1, 6),  # | * * * |
+        (0, 6),  # |     * |
+        (0, 5),  # | * * * |
+        (0, 4),
+        (1, 4),
+        (2, 4),
+        (3, 4),
+        (4, 4),
+        (4, 5),
+        (4, 6),
+        )
+    }
+
+ARABIC_NUMBERS_TO_DRAW = {
+    0: (
+        (4, 5),  # |   *   |
+        ),
+
+    1: (
+        (0, 5),  # |   *   |
+        (1, 4),  # |   *   |
+        (2, 4),  # |   *   |
+        (3, 4),  # |   *   |
+        (4, 4),  # |   *   |
+        ),
+
+    2: (
+        (0, 4),  # |   * * |
+        (0, 5),  # | *     |
+        (1, 6),  # | *     |
+        (2, 6),  # |   *   |
+        (3, 5),  # |     * |
+        (4, 4),
+        ),
+
+    3: (
+        (0, 4),  # | *   *  |
+        (1, 4),  # | * * *  |
+        (1, 5),  # | *      |
+        (0, 6),  # | *      |
+        (1, 6),  # | *      |
+        (2, 6),
+        (3, 6),
+        (4, 6),
+        ),
+
+    4: (
+        (0, 4),  # |   * * |
+        (0, 5),  # | *     |
+        (1, 6),  # |   * * |
+        (2, 4),  # | *     |
+        (2, 5),  # |   * * |
+        (3, 6),
+        (4, 5),
+        (4, 4),
+        ),
+
+    5: (
+        (3, 6),  # |       |
+        (2, 6),  # |   *   |
+        (1, 5),  # | *   * |
+        (2, 4),  # | *   * |
+        (3, 4),  # | * * * |
+        (4, 4),
+        (4, 5),
+        (4, 6),
+        ),
+
+    6: (
+        (0, 6),  # | * * * |
+        (0, 5),  # |     * |
+        (0, 4),  # |     * |
+        (1, 4),  # |     * |
+        (2, 4),  # |     * |
+        (3, 4),
+        (4, 4),
+        ),
+
+    7: (
+        (0, 6),  # | *   * |
+        (1, 6),  # | *   * |
+        (2, 6),  # | *   * |
+        (3, 6),  # | *   * |
+        (4, 5),  # |   *   |
+        (3, 4),
+        (2, 4),
+        (1, 4),
+        (0, 4),
+        ),
+
+    8: (
+        (4, 6),  # |   *   |
+        (3, 6),  # | *   * |
+        (2, 6),  # | *   * |
+        (1, 6),  # | *   * |
+        (0, 5),  # | *   * |
+        (1, 4),
+        (2, 4),
+        (3, 4),
+        (4, 4),
+        ),
+
+    9: (
+        (0, 4),  # | * * * |
+        (0, 5),  # | *   * |
+        (0, 6),  # | * * * |
+        (1, 6),  # |     * |
+        (2, 6),  # |     * |
+        (2, 5),
+        (1, 4),
+        (2, 4),
+        (3, 4),
+        (4, 4),
+        )
+    }
+
+NUMBERS_TO_DRAW_BY_LANGUAGE = {
+    "English": ENGLISH_NUMBERS_TO_DRAW,
+    "Arabic" : ARABIC_NUMBERS_TO_DRAW,
+    }
+
+if LANGUAGE not in NUMBERS_TO_DRAW_BY_LANGUAGE:
     print(f"constants: Invalid or unsupported language value '{LANGUAGE}'")
     exit(1)
+
+NUMBERS_TO_DRAW = NUMBERS_TO_DRAW_BY_LANGUAGE[LANGUAGE]
@@ -0,0 +1,83 @@
+"""Define the in-memory framebuffer every drawing call writes into before it is sent to the screen"""
+import numpy
+
+# The Unicorn Hat Mini is 17 x 7 pixels, three colour channels each.
+DISPLAY_WIDTH = 17
+DISPLAY_HEIGHT = 7
+
+
+class FrameBuffer:
+    """Hold one frame of pixels in memory and only push it to the display on flush().
+
+    The last frame sent to the display is remembered, so a flush only writes the pixels that
+    changed and skips the show() entirely when nothing did."""
+
+    def __init__(self, display, width: int = DISPLAY_WIDTH, height: int = DISPLAY_HEIGHT) -> None:
+        self.display = display
+        self.width = width
+        self.height = height
+        self.pixels = numpy.zeros((width, height, 3), dtype = numpy.uint8)
+
+        # What the display is currently showing. None until the first flush.
+        self.committed = None
+
+        self.flushes = 0
+        self.stats = self.empty_stats()
+
+    @staticmethod
+    def empty_stats() -> dict:
+        """Counters for the pixels and flushes sent or saved since the last report."""
+        return {
+            "flushes"        : 0,
+            "flushes_skipped": 0,
+            "pixels_written" : 0,
+            "pixels_skipped" : 0,
+            }
+
+    def set_pixel(self, x: int, y: int, red: int, green: int, blue: int) -> None:
+        """Set a single pixel in the frame. Negative coordinates wrap around like the hardware."""
+        self.pixels[x, y] = (red, green, blue)
+
+    def clear(self) -> None:
+        """Blank the whole frame."""
+        self.pixels[:] = 0
+
+    def clear_section(self, start_x: int, end_x: int, start_y: int, end_y: int) -> None:
+        """Blank an inclusive rectangle of the frame."""
+        self.pixels[start_x:end_x + 1, start_y:end_y + 1] = 0
+
+    def flush(self, force: bool = False) -> int:
+        """Send the pixels that changed since the last flush to the display as a single show().
+        Returns the number of pixels written. If force = True, the whole frame is resent."""
+        if force or self.committed is None:
+            changed = numpy.ones((self.width, self.height), dtype = bool)
+        else:
+            changed = (self.pixels != self.committed).any(axis = 2)
+
+        total_pixels = self.width * self.height
+        xs, ys = numpy.nonzero(changed)
+
+        if len(xs) == 0:
+            self.stats["flushes_skipped"] += 1
+            self.stats["pixels_skipped"] += total_pixels
+            return 0
+
+        for x, y, (red, green, blue) in zip(xs.tolist(), ys.tolist(),
+                                            self.pixels[xs, ys].tolist()
+                                            ):
+            self.display.set_pixel(x, y, red, green, blue)
+
+        self.display.show()
+        self.committed = self.pixels.copy()
+
+        self.flushes += 1
+        self.stats["flushes"] += 1
+        self.stats["pixels_written"] += len(xs)
+        self.stats["pixels_skipped"] += total_pixels - len(xs)
+        return len(xs)
+
+    def report(self) -> dict:
+        """Return the counters gathered since the last report and start counting again."""
+        stats = self.stats
+        self.stats = self.empty_stats()
+        return stats
@@ -4,26 +4,64 @@ import time
 import json
 import warnings
 import traceback
-import requests
-import slack_sdk
-import xmltodict
+from xml.etree import ElementTree
 
-from adjustable_settings import TIME_DELAY
-from constants import COLORS, NUMBERS_TO_DRAW, MAX_NUMBER
+from adjustable_settings import TIME_DELAY, ANIMATE_DRAWING
+from constants import COLORS, MAX_NUMBER, DISPLAY_BACKEND_VARIABLE
+from framebuffer import FrameBuffer
+from glyphs import GLYPHS
+from http_client import HTTP_CLIENT
+from rate_limiting import RetryPolicy
+from scheduler import DeadlineScheduler
 
-# Initialize Unicorn Hat Mini.
-try:
-    from unicornhatmini import UnicornHATMini as unicornHat
+# Bytes read from the network at a time when streaming an XML response
+XML_CHUNK_SIZE = 4096
 
-    unicornhatmini = unicornHat()
 
-# Mock Unicorn Hat Mini in the event it is run on a local device.
-except ImportError:
-    os.environ['GPIOZERO_PIN_FACTORY'] = os.environ.get('GPIOZERO_PIN_FACTORY', 'mock')
-    import gpiozero
-    from unicorn_hat_sim import unicornhathd as unicornHat
+def open_display():
+    """Initialize the Unicorn Hat Mini, or the headless display if DISPLAY_BACKEND_VARIABLE is set
+    to "headless"."""
+    if os.environ.get(DISPLAY_BACKEND_VARIABLE) == "headless":
+        os.environ['GPIOZERO_PIN_FACTORY'] = os.environ.get('GPIOZERO_PIN_FACTORY', 'mock')
+        from headless_display import HeadlessDisplay
 
-    unicornhatmini = unicornHat
+        return HeadlessDisplay()
+
+    try:
+        from unicornhatmini import UnicornHATMini as unicornHat
+
+        return unicornHat()
+
+    # Mock Unicorn Hat Mini in the event it is run on a local device.
+    except ImportError:
+        os.environ['GPIOZERO_PIN_FACTORY'] = os.environ.get('GPIOZERO_PIN_FACTORY', 'mock')
+        import gpiozero
+        from unicorn_hat_sim import unicornhathd as unicornHat
+
+        return unicornHat
+
+
+class LazyDisplay:
+    """Stands in for the display and only initializes it the first time it is used, so importing
+    this module (e.g. for a benchmark) doesn't set up the hardware."""
+
+    def __init__(self, opener) -> None:
+        self.opener = opener
+        self.display = None
+
+    def __getattr__(self, name: str):
+        if self.display is None:
+            self.display = self.opener()
+        return getattr(self.display, name)
+
+
+unicornhatmini = LazyDisplay(open_display)
+
+# Every drawing call writes into this frame; nothing reaches the screen until it is flushed.
+framebuffer = FrameBuffer(unicornhatmini)
+
+# Paces the frames of the stroke by stroke animation.
+animation_clock = DeadlineScheduler(TIME_DELAY, name = "animation")
 
 
 def api_call_to_json(method: str,
@@ -34,11 +72,31 @@ def api_call_to_json(method: str,
                      headers = None,
                      params = None,
                      body = None,
-                     mock_run = False
+                     mock_run = False,
+                     client = None,
+                     retry_policy = None,
+                     rate_limiter = None,
+                     xml_paths = None
                      ) -> [dict, int]:
     """Runs an API call and returns the result in JSON. If mock_run = True, print the result here
-    instead."""
-    __version__ = "4.2"
+    instead. The call goes through the pooled HTTP_CLIENT unless another client is given.
+
+    Failed calls are retried according to retry_policy. If a rate_limiter is given, every call
+    takes a token from it, and the call fails with "rate_limited" when there are none left.
+
+    The response is parsed according to its Content-Type. If xml_paths is given and the response
+    is XML, it is streamed through an incremental parser that stops as soon as every path is
+    found, and "output" is {path: value}. See parse_xml_paths() for the path format."""
+    __version__ = "4.5"
+
+    # Only imported once the first call is made, to keep startup fast.
+    import requests
+
+    if client is None:
+        client = HTTP_CLIENT
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
 
     input_arguments = {
         "method"   : method,
@@ -73,49 +131,54 @@ def api_call_to_json(method: str,
             return_dict["output"] = {}
             return return_dict, api_calls
 
-        if method == "GET":
-            response = requests.get(url = url,
-                                    auth = authentication,
-                                    headers = headers,
-                                    params = params,
-                                    data = body
-                                    )
-            api_calls += 1
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            return_dict["result"] = "error"
+            return_dict["error"] = "invalid_or_unsupported_method"
+            return_dict["api_calls"] = api_calls
+            return return_dict, api_calls
 
-        elif method == "POST":
-            response = requests.post(url = url,
-                                     auth = authentication,
-                                     headers = headers,
-                                     params = params,
-                                     data = body
-                                     )
-            api_calls += 1
+        attempt = 0
+        while True:
+            attempt += 1
 
-        elif method == "PUT":
-            response = requests.put(url = url,
-                                    auth = authentication,
-                                    headers = headers,
-                                    params = params,
-                                    data = body
-                                    )
-            api_calls += 1
+            if rate_limiter is not None and not rate_limiter.try_acquire():
+                print("api_call_to_json: rate limit reached for {} ({}), next call allowed in {:.0f}s"
+                      .format(name, url, rate_limiter.seconds_until_available())
+                      )
+                return_dict["result"] = "error"
+                return_dict["error"] = "rate_limited"
+                return_dict["api_calls"] = api_calls
+                return return_dict, api_calls
 
-        elif method == "DELETE":
-            response = requests.delete(url = url,
-                                       auth = authentication,
-                                       headers = headers,
-                                       params = params,
-                                       data = body
-                                       )
+            # Timed here rather than read from the client's stats, which other threads update.
+            request_start = time.perf_counter()
+            response = client.request(method,
+                                      url,
+                                      auth = authentication,
+                                      headers = headers,
+                                      params = params,
+                                      data = body,
+                                      stream = xml_paths is not None
+                                      )
             api_calls += 1
+            return_dict["attempts"] = attempt
+            return_dict["elapsed_seconds"] = time.perf_counter() - request_start
+            return_dict["status_code"] = response.status_code
 
-        else:
-            return_dict["result"] = "error"
-            return_dict["error"] = "invalid_or_unsupported_method"
-            return_dict["api_calls"] = api_calls
-            return return_dict, api_calls
+            # 429 – Too Many Requests, or a temporary server error.
+            # Wait for as long as the server asks, or back off, then send the same call again.
+            if not retry_policy.should_retry(response.status_code, attempt):
+                break
 
-        return_dict["status_code"] = response.status_code
+            sleep_seconds = retry_policy.delay(attempt, response.headers.get("retry-after"))
+            if sleep_seconds is None:
+                break
+
+            print("Got a {} in {} '{}' for '{}'. Will sleep for {:.1f} seconds and then try again."
+                  .format(response.status_code, method, url, name, sleep_seconds)
+                  )
+            response.close()
+            time.sleep(sleep_seconds)
 
         # 204 – No Content
         # Request succeeded, but nothing returned that would be worth a JSON conversion.
@@ -126,36 +189,12 @@ def api_call_to_json(method: str,
             return_dict["api_calls"] = api_calls
             return return_dict, api_calls
 
-        # 429 – Too Many Requests
-        # if a 429, lets call this again after sleeping for the amount specified in the request.
-        if return_dict["status_code"] == 429:
-            sleep_seconds = 5
-
-            if "retry-after" in response.headers.keys():
-                sleep_seconds = float(response.headers["retry-after"])
-
-            if mock_run:
-                print("Got a 429 in {} '{}' for '{}'. Will sleep for {} seconds and then try again."
-                      .format(method, url, name, sleep_seconds)
-                      )
-
-            time.sleep(sleep_seconds)
-
-            # One of the few times I ever use recursion, a function invoking itself.
-            # Theoretically if we keep getting 429s this can run forever.
-            return api_call_to_json(method,
-                                    name,
-                                    url,
-                                    api_calls,
-                                    authentication,
-                                    headers,
-                                    body,
-                                    mock_run
-                                    )
-
         if return_dict["status_code"] >= 400:
             return_dict["result"] = "error"
-            return_dict["error"] = "http_error_returned"
+            if return_dict["status_code"] in retry_policy.retry_status_codes:
+                return_dict["error"] = "retries_exhausted"
+            else:
+                return_dict["error"] = "http_error_returned"
             return_dict["api_calls"] = api_calls
             return_dict["response"] = response
             try:
@@ -166,22 +205,40 @@ def api_call_to_json(method: str,
             return return_dict, api_calls
 
         try:
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+
+            # Only look at the start of the body when the server doesn't say what it sent.
+            if content_type in ("", "text/plain", "text/html", "application/octet-stream"):
+                start_of_body = response.content[:256]
+                if b"<?xml version" in start_of_body:
+                    content_type = "application/xml"
+
             # If the result is XML, convert it to JSON
-            if "<?xml version" in response.text:
-                # Remove everything before the first <?xml version>"
+            if content_type.endswith("/xml") or content_type.endswith("+xml"):
                 return_dict["result"] = "success"
                 return_dict["wasXML"] = True
                 return_dict["api_calls"] = api_calls
-                return_dict["output"] = xmltodict.parse(response.text[
-                                                        response.text.find("<?xml version"):]
-                                                        )
+
+                if xml_paths is not None:
+                    return_dict["output"] = parse_xml_paths(response.iter_content(XML_CHUNK_SIZE),
+                                                            xml_paths
+                                                            )
+                    response.close()
+                    return return_dict, api_calls
+
+                # Only needed for whole XML documents, so only imported when one turns up.
+                import xmltodict
+
+                # Remove everything before the first <?xml version>"
+                content = response.content
+                return_dict["output"] = xmltodict.parse(content[max(content.find(b"<?xml"), 0):])
                 return return_dict, api_calls
 
             else:
                 return_dict["result"] = "success"
                 return_dict["wasXML"] = False
                 return_dict["api_calls"] = api_calls
-                return_dict["output"] = json.loads(response.text)
+                return_dict["output"] = json.loads(response.content)
                 return return_dict, api_calls
 
         except Exception as e:
@@ -193,6 +250,16 @@ def api_call_to_json(method: str,
             return_dict["response"] = response
             return return_dict, api_calls
 
+    except requests.exceptions.Timeout:
+        print("api_call_to_json timed out after {}s connect / {}s read at {} ({})".format(
+            client.connect_timeout, client.read_timeout, name, url
+            )
+            )
+        return_dict["result"] = "error"
+        return_dict["error"] = "timeout"
+        return_dict["api_calls"] = api_calls
+        return return_dict, api_calls
+
     except TimeoutError:
         print("api_call_to_json encountered a timeout error at {} ({})".format(name, url))
         return_dict["result"] = "error"
@@ -209,6 +276,59 @@ def api_call_to_json(method: str,
         return return_dict, api_calls
 
 
+async def api_call_to_json_async(*args, **kwargs) -> [dict, int]:
+    """api_call_to_json for asyncio: the blocking call runs in a worker thread, so the event loop
+    keeps running while it waits on the network. Takes and returns the same as api_call_to_json."""
+    import asyncio
+
+    return await asyncio.to_thread(api_call_to_json, *args, **kwargs)
+
+
+def parse_xml_paths(chunks, paths: list) -> dict:
+    """Parse XML from an iterable of byte chunks, stopping as soon as every path has been found.
+
+    A path is made of element names under the root separated by "/", e.g. "city/sun". Its value
+    is the element's text, or one of its attributes with "@", e.g. "temperature@value". Paths
+    that are never found are None."""
+    wanted = {}
+    for path in paths:
+        element_path, _, attribute = path.partition("@")
+        wanted[path] = (tuple(element_path.split("/")), attribute or None)
+
+    found = {}
+    open_elements = []
+    parser = ElementTree.XMLPullParser(events = ("start", "end"))
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+        for event, element in parser.read_events():
+            if event == "start":
+                open_elements.append(element.tag)
+                element_path = tuple(open_elements[1:])
+
+                # Attributes are known as soon as the element starts.
+                for path, (tags, attribute) in wanted.items():
+                    if attribute is not None and tags == element_path and path not in found:
+                        found[path] = element.get(attribute)
+
+            else:
+                element_path = tuple(open_elements[1:])
+
+                # Text is only complete once the element ends.
+                for path, (tags, attribute) in wanted.items():
+                    if attribute is None and tags == element_path and path not in found:
+                        found[path] = element.text
+
+                open_elements.pop()
+                element.clear()
+
+            if len(found) == len(wanted):
+                return found
+
+    return {path: found.get(path) for path in wanted}
+
+
 def post_to_slack(slack_channel: str, post_text: str,
                   slack_api_key: str, api_calls: int, mock_run: bool, post_image = None
                   ) -> [dict, int]:
@@ -231,6 +351,9 @@ def post_to_slack(slack_channel: str, post_text: str,
                                    )
 
     try:
+        # Only imported once the first post is made, to keep startup fast.
+        import slack_sdk
+
         if post_image:
             if mock_run:
                 print("This would have posted to {}: ---".format(slack_channel))
@@ -327,11 +450,17 @@ def validate_environment_variables(module: str, required_environment_variables_l
         exit(1)
 
 
+def set_brightness(brightness: float) -> None:
+    """Set the screen brightness, on the Unicorn Hat Mini or its simulator."""
+    try:
+        unicornhatmini.set_brightness(brightness)
+    except AttributeError:
+        unicornhatmini.brightness(brightness)
+
+
 def clear_section(start_x: int, end_x: int, start_y: int, end_y: int) -> None:
     """Clear a section of pixels, such as when changing the number or an entire line for a new
-    hour."""
-    this_x = start_x
-
+    hour. This only changes the framebuffer; call flush() to show it."""
     if start_x > end_x:
         print("Error, cannot clear section as start_x: {} is greater than end_x: {}".format(start_x,
                                                                                             end_x
@@ -344,15 +473,13 @@ def clear_section(start_x: int, end_x: int, start_y: int, end_y: int) -> None:
                                                                                             )
               )
 
-    while this_x <= end_x:
-        this_y = start_y
-        while this_y <= end_y:
-            unicornhatmini.set_pixel(this_x, this_y, 0, 0, 0)
-            this_y += 1
-        this_x += 1
+    framebuffer.clear_section(start_x, end_x, start_y, end_y)
+
 
-    time.sleep(TIME_DELAY)
-    unicornhatmini.show()
+def flush(force: bool = False) -> int:
+    """Send the current framebuffer to the Unicorn Hat Mini as one frame. Only the pixels that
+    changed since the last flush are written; returns how many that was."""
+    return framebuffer.flush(force)
 
 
 def display_number(number: int,
@@ -360,47 +487,65 @@ def display_number(number: int,
                    y_offset: int,
                    clear: bool = False,
                    rgb: tuple = None,
-                   test: bool = False
+                   test: bool = False,
+                   animate: bool = None
                    ) -> None:
-    """Display a single number"""
+    """Display a single number. If animate = True, the number is drawn stroke by stroke, flushing
+    after every pixel; otherwise it is only written to the framebuffer."""
     if rgb is None:
         rgb = COLORS["white"]
 
+    if animate is None:
+        animate = ANIMATE_DRAWING
+
     if clear or test:
-        unicornhatmini.clear()
+        framebuffer.clear()
+
+    if not animate:
+        GLYPHS.blit(framebuffer.pixels, number, x_offset, y_offset, rgb)
+
+        # Show the same number 6 times to ensure the display is working on the test mode.
+        # The copies on the far side of the screen match the wrap-around of the animated mode.
+        if test:
+            for copy_x, copy_y in ((6, 0), (12, 0), (0, -4), (6, -4), (12, -4)):
+                GLYPHS.blit(framebuffer.pixels, number, x_offset + copy_x, y_offset + copy_y, rgb)
+        return
 
     red = rgb[0]
     green = rgb[1]
     blue = rgb[2]
 
-    for pixel in NUMBERS_TO_DRAW[number]:
+    animation_clock.start()
+
+    for pixel in GLYPHS.strokes[number]:
         x = pixel[0] + x_offset
         y = pixel[1] + y_offset
 
         if abs(x) >= MAX_NUMBER or abs(y) >= MAX_NUMBER:
             print(f"Max value reached: ({x},{y})")
-            unicornhatmini.show()
+            framebuffer.flush()
             return
 
-        unicornhatmini.set_pixel(x, y, red, green, blue)
+        framebuffer.set_pixel(x, y, red, green, blue)
 
         # Show the same number 6 times to ensure the display is working on the test mode.
         if test:
-            unicornhatmini.set_pixel(x + 6, y, red, green, blue)
-            unicornhatmini.set_pixel(x - 5, y, red, green, blue)
-            unicornhatmini.set_pixel(x, y - 4, red, green, blue)
-            unicornhatmini.set_pixel(x + 6, y - 4, red, green, blue)
-            unicornhatmini.set_pixel(x - 5, y - 4, red, green, blue)
+            framebuffer.set_pixel(x + 6, y, red, green, blue)
+            framebuffer.set_pixel(x - 5, y, red, green, blue)
+            framebuffer.set_pixel(x, y - 4, red, green, blue)
+            framebuffer.set_pixel(x + 6, y - 4, red, green, blue)
+            framebuffer.set_pixel(x - 5, y - 4, red, green, blue)
 
-        unicornhatmini.show()
-        time.sleep(TIME_DELAY)
+        framebuffer.flush()
+        animation_clock.sleep()
 
 
 def test_numbers() -> None:
     """Initial run of the clock to show you the numbers and to verify it all works."""
     current_number = 9
     while current_number >= 0:
-        display_number(current_number, 0, 0, test = True)
+        display_number(current_number, 0, 0, test = True, animate = True)
         time.sleep(TIME_DELAY * 2)
         current_number -= 1
-    unicornhatmini.clear()
+    framebuffer.clear()
+    framebuffer.flush()
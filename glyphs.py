@@ -0,0 +1,63 @@
+"""Define the glyph atlas: every number to draw pre-compiled into a boolean mask at import time"""
+import numpy
+
+from adjustable_settings import LANGUAGE
+from constants import NUMBERS_TO_DRAW_BY_LANGUAGE
+
+
+class GlyphAtlas:
+    """All the numbers of one language as boolean masks sharing the same bounding box.
+
+    masks[number][x, y] is True where the pixel (x + origin_x, y + origin_y) is lit."""
+
+    def __init__(self, numbers_to_draw: dict) -> None:
+        all_pixels = [pixel for strokes in numbers_to_draw.values() for pixel in strokes]
+
+        self.origin_x = min(x for x, _ in all_pixels)
+        self.origin_y = min(y for _, y in all_pixels)
+        self.width = max(x for x, _ in all_pixels) - self.origin_x + 1
+        self.height = max(y for _, y in all_pixels) - self.origin_y + 1
+
+        self.masks = numpy.zeros((len(numbers_to_draw), self.width, self.height), dtype = bool)
+
+        for number, strokes in numbers_to_draw.items():
+            xs = [x - self.origin_x for x, _ in strokes]
+            ys = [y - self.origin_y for _, y in strokes]
+            self.masks[number, xs, ys] = True
+
+        # Keep the stroke order for the animated, drawn-by-hand mode.
+        self.strokes = numbers_to_draw
+
+    def blit(self, pixels: numpy.ndarray, number: int, x_offset: int, y_offset: int,
+             rgb: tuple
+             ) -> None:
+        """Draw a number into a (width, height, 3) frame with a single masked slice assignment.
+        Anything falling outside the frame is clipped."""
+        mask = self.masks[number]
+
+        left = x_offset + self.origin_x
+        top = y_offset + self.origin_y
+
+        # Work out the visible part of the glyph once, instead of checking every pixel.
+        start_x = max(left, 0)
+        start_y = max(top, 0)
+        end_x = min(left + self.width, pixels.shape[0])
+        end_y = min(top + self.height, pixels.shape[1])
+
+        if start_x >= end_x or start_y >= end_y:
+            print(f"Max value reached: number {number} at ({x_offset},{y_offset}) is off screen")
+            return
+
+        visible = mask[start_x - left:end_x - left, start_y - top:end_y - top]
+
+        if visible.shape != mask.shape and visible.sum() != mask.sum():
+            print(f"Max value reached: number {number} at ({x_offset},{y_offset}) was clipped")
+
+        pixels[start_x:end_x, start_y:end_y][visible] = rgb
+
+
+GLYPH_ATLASES = {language: GlyphAtlas(numbers_to_draw)
+                 for language, numbers_to_draw in NUMBERS_TO_DRAW_BY_LANGUAGE.items()
+                 }
+
+GLYPHS = GLYPH_ATLASES[LANGUAGE]
@@ -0,0 +1,92 @@
+"""Define the headless display: an in-memory stand-in for the Unicorn Hat Mini for tests and
+benchmarks
+
+Select it with WEATHER_STATION_DISPLAY=headless. No hardware, pygame or window is needed."""
+import struct
+import zlib
+
+import numpy
+
+from framebuffer import DISPLAY_WIDTH, DISPLAY_HEIGHT
+
+# From dark to bright, for the ASCII art
+ASCII_SHADES = " .:-=+*#%@"
+
+
+class HeadlessDisplay:
+    """Keeps the pixels in a numpy array, with the same set_pixel/show/clear/set_brightness
+    methods as the Unicorn Hat Mini. Counts every call, and exports what is shown as ASCII art or
+    a PNG file."""
+
+    def __init__(self, width: int = DISPLAY_WIDTH, height: int = DISPLAY_HEIGHT) -> None:
+        self.width = width
+        self.height = height
+        self.buffer = numpy.zeros((width, height, 3), dtype = numpy.uint8)
+        self.shown = numpy.zeros((width, height, 3), dtype = numpy.uint8)
+        self.brightness = 0.5
+        self.stats = {
+            "shows"       : 0,
+            "pixel_writes": 0,
+            "clears"      : 0,
+            }
+
+    def get_shape(self) -> tuple:
+        return self.width, self.height
+
+    def set_pixel(self, x: int, y: int, red: int, green: int, blue: int) -> None:
+        self.buffer[x, y] = (red, green, blue)
+        self.stats["pixel_writes"] += 1
+
+    def set_all(self, red: int, green: int, blue: int) -> None:
+        self.buffer[:] = (red, green, blue)
+        self.stats["pixel_writes"] += self.width * self.height
+
+    def clear(self) -> None:
+        self.buffer[:] = 0
+        self.stats["clears"] += 1
+
+    def show(self) -> None:
+        self.shown[:] = self.buffer
+        self.stats["shows"] += 1
+
+    def set_brightness(self, brightness: float) -> None:
+        self.brightness = brightness
+
+    def to_ascii(self, frame: numpy.ndarray = None) -> str:
+        """The shown frame (or another one) as text, one line per row of the display, each pixel
+        shaded by its brightest channel."""
+        if frame is None:
+            frame = self.shown
+
+        levels = frame.max(axis = 2).astype(int) * (len(ASCII_SHADES) - 1) // 255
+        return "\n".join("".join(ASCII_SHADES[level] for level in levels[:, y])
+                         for y in range(frame.shape[1])
+                         )
+
+    def save_png(self, path: str, frame: numpy.ndarray = None, scale: int = 10) -> None:
+        """Write the shown frame (or another one) to a PNG file, each pixel as a scale x scale
+        square."""
+        if frame is None:
+            frame = self.shown
+
+        # PNG rows go across, so put y first, then blow every pixel up to a square.
+        image = frame.transpose(1, 0, 2).repeat(scale, axis = 0).repeat(scale, axis = 1)
+        height, width = image.shape[:2]
+
+        # Every row starts with filter type 0 (none).
+        raw = b"".join(b"\x00" + image[row].tobytes() for row in range(height))
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return (struct.pack(">I", len(data)) + kind + data
+                    + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+                    )
+
+        with open(path, "wb") as png_file:
+            png_file.write(b"\x89PNG\r\n\x1a\n")
+            png_file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+            png_file.write(chunk(b"IDAT", zlib.compress(raw)))
+            png_file.write(chunk(b"IEND", b""))
+
+    def report(self) -> dict:
+        """The counters, and how many pixels are lit right now."""
+        return dict(self.stats, lit_pixels = int(self.shown.any(axis = 2).sum()))
@@ -0,0 +1,101 @@
+"""Define the pooled HTTP client shared by every API call"""
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from constants import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE
+
+# requests takes a while to import, so it is only imported when the first call is made.
+if TYPE_CHECKING:
+    import requests
+
+
+class HttpClient:
+    """A requests.Session kept open between calls, so the TCP and TLS connection to the API is
+    reused (keep-alive) instead of being set up again on every refresh.
+
+    Every call gets a connect and read timeout, and its latency is recorded. Calls can be made
+    from several threads at once. The session is only set up on the first call."""
+
+    def __init__(self,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 pool_size: int = HTTP_POOL_SIZE,
+                 session: "requests.Session" = None
+                 ) -> None:
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.session = session
+        self.session_lock = threading.Lock()
+        self.stats = {
+            "calls"        : 0,
+            "errors"       : 0,
+            "total_seconds": 0.0,
+            "min_seconds"  : None,
+            "max_seconds"  : None,
+            "last_seconds" : None,
+            }
+        self.stats_lock = threading.Lock()
+
+    def get_session(self) -> "requests.Session":
+        """The pooled session, set up on first use."""
+        with self.session_lock:
+            if self.session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections = self.pool_size,
+                                      pool_maxsize = self.pool_size
+                                      )
+                self.session.mount("http://", adapter)
+                self.session.mount("https://", adapter)
+
+            return self.session
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        """Send a request through the pooled session, using the default timeouts unless a timeout
+        is given."""
+        session = self.get_session()
+        import requests
+
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+
+        start = time.perf_counter()
+        try:
+            return session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self.stats_lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            self.record_latency(time.perf_counter() - start)
+
+    def record_latency(self, seconds: float) -> None:
+        """Add the duration of one call to the latency stats."""
+        with self.stats_lock:
+            self.stats["calls"] += 1
+            self.stats["total_seconds"] += seconds
+            self.stats["last_seconds"] = seconds
+
+            if self.stats["min_seconds"] is None or seconds < self.stats["min_seconds"]:
+                self.stats["min_seconds"] = seconds
+            if self.stats["max_seconds"] is None or seconds > self.stats["max_seconds"]:
+                self.stats["max_seconds"] = seconds
+
+    def latency_stats(self) -> dict:
+        """Return the latency stats, including the mean call time."""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["mean_seconds"] = stats["total_seconds"] / stats["calls"] if stats["calls"] else None
+        return stats
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        if self.session is not None:
+            self.session.close()
+
+
+# The client every API call uses unless another one is passed in.
+HTTP_CLIENT = HttpClient()
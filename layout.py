@@ -0,0 +1,116 @@
+"""Define the layout of the temperature rows, with every reading pre-rendered on first use"""
+import numpy
+
+from constants import COLOR_SCHEMES
+from framebuffer import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from glyphs import GLYPHS
+
+# Each temperature takes one row of the vertical display, starting at these x offsets.
+ROW_OFFSETS = (0, 6, 12)
+
+# Two digits fit on a row, so anything outside of this range is shown as an error.
+MIN_READING = -99
+MAX_READING = 99
+ERROR_READING = "error"
+
+# An optional reading the API didn't send, which leaves its row blank
+MISSING_READING = "missing"
+
+# Where the digits go across a row
+TENS_Y_OFFSET = 0
+ONES_Y_OFFSET = -4
+SINGLE_Y_OFFSET = -2
+
+
+def digit_placements(reading) -> list:
+    """Return the (digit, y_offset, colour) to draw for a reading, colour being a key of a colour
+    scheme. Negative readings are drawn without a sign, in the negative colour."""
+    if reading == ERROR_READING:
+        return [(0, TENS_Y_OFFSET, "error"), (0, ONES_Y_OFFSET, "error")]
+
+    color = "negative" if reading < 0 else "positive"
+    magnitude = abs(reading)
+
+    if magnitude < 10:
+        return [(magnitude, SINGLE_Y_OFFSET, color)]
+
+    return [(magnitude // 10, TENS_Y_OFFSET, color), (magnitude % 10, ONES_Y_OFFSET, color)]
+
+
+def reading_index(reading) -> int:
+    """Position of a reading in the frame table."""
+    if reading == ERROR_READING:
+        return MAX_READING - MIN_READING + 1
+    return reading - MIN_READING
+
+
+def build_frame_table(color_scheme: dict) -> numpy.ndarray:
+    """Render every reading on every row for one colour scheme.
+
+    The result is indexed as [row, reading_index(reading)] and gives a whole frame."""
+    readings = list(range(MIN_READING, MAX_READING + 1)) + [ERROR_READING]
+    table = numpy.zeros((len(ROW_OFFSETS), len(readings), DISPLAY_WIDTH, DISPLAY_HEIGHT, 3),
+                        dtype = numpy.uint8
+                        )
+
+    for row, x_offset in enumerate(ROW_OFFSETS):
+        for reading in readings:
+            frame = table[row, reading_index(reading)]
+            for digit, y_offset, color in digit_placements(reading):
+                GLYPHS.blit(frame, digit, x_offset, y_offset, color_scheme[color])
+
+    return table
+
+
+# The frame table of each colour scheme, built the first time the scheme is drawn
+FRAME_TABLE = {}
+
+
+def frame_table(scheme: str) -> numpy.ndarray:
+    """The frame table of a colour scheme, building it if it hasn't been yet."""
+    table = FRAME_TABLE.get(scheme)
+    if table is None:
+        table = FRAME_TABLE[scheme] = build_frame_table(COLOR_SCHEMES[scheme])
+    return table
+
+
+def parse_reading(value):
+    """Round a temperature to a displayable reading, or ERROR_READING if it can't be shown."""
+    try:
+        reading = round(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return ERROR_READING
+
+    if not MIN_READING <= reading <= MAX_READING:
+        return ERROR_READING
+
+    return reading
+
+
+def render_reading(pixels: numpy.ndarray, row: int, value, name: str = "reading",
+                   scheme: str = "default", optional: bool = False, report: bool = True
+                   ):
+    """OR the pre-rendered frame for a temperature into the given row of a frame. Returns the
+    reading that was drawn.
+
+    If optional = True, a missing value (None) leaves the row blank instead of showing an error.
+    Values that can't be shown are printed, unless report = False."""
+    if optional and value is None:
+        return MISSING_READING
+
+    reading = parse_reading(value)
+
+    if reading == ERROR_READING and report:
+        print(f"Error: can't decipher value {name} = {value}")
+
+    numpy.bitwise_or(pixels, frame_table(scheme)[row, reading_index(reading)], out = pixels)
+    return reading
+
+
+def render_forecast(pixels: numpy.ndarray, forecast, scheme: str = "default") -> None:
+    """Clear the frame and draw the current, expected and later temperatures of a Forecast on the
+    1st, 2nd and 3rd rows."""
+    pixels[:] = 0
+    render_reading(pixels, 0, forecast.current_feels_like, "current_feels_like", scheme)
+    render_reading(pixels, 1, forecast.expected_feels_like, "expected_feels_like", scheme)
+    render_reading(pixels, 2, forecast.later_feels_like, "later_feels_like", scheme)
@@ -0,0 +1,191 @@
+"""Define the locations the display switches between, fetched together and pre-rendered as pages"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+from adjustable_settings import LOCATION_LATITUDE_, LOCATION_LONGITUDE, EXTRA_LOCATIONS, UNIT_KIND
+from circuit_breaker import CircuitBreaker
+from constants import SNAPSHOT_PATH, LOCATION_FETCH_WORKERS, CANONICAL_UNITS
+from framebuffer import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from snapshot import load_snapshot, save_snapshot
+from units import UNIT_SYSTEMS, convert_forecast
+from views import VIEW_NAMES, render_view
+from weather import Forecast, fetch_forecast, forecast_from_dict
+
+
+def locations_from(latitude: float, longitude: float, extra_locations: list) -> list:
+    """Every location to show, as (latitude, longitude), the main one first."""
+    return [(latitude, longitude)] + [tuple(location) for location in extra_locations]
+
+
+LOCATIONS = locations_from(LOCATION_LATITUDE_, LOCATION_LONGITUDE, EXTRA_LOCATIONS)
+
+
+def snapshot_path(index: int, location: tuple) -> str:
+    """Where the snapshot of a location is kept. The first location keeps using SNAPSHOT_PATH."""
+    if index == 0:
+        return SNAPSHOT_PATH
+    root, extension = os.path.splitext(SNAPSHOT_PATH)
+    return f"{root}_{location[0]}_{location[1]}{extension}"
+
+
+def fetch_forecasts(locations: list,
+                    api_calls: int,
+                    units: str = CANONICAL_UNITS,
+                    max_workers: int = LOCATION_FETCH_WORKERS,
+                    **api_call_arguments
+                    ) -> [list, int]:
+    """Fetch the forecast for every location at the same time, at most max_workers at once. The
+    calls share the pooled HTTP client and any rate_limiter passed in. Returns the fetch_forecast
+    results in the same order as the locations."""
+    with ThreadPoolExecutor(max_workers = max(min(max_workers, len(locations)), 1),
+                            thread_name_prefix = "fetch-location"
+                            ) as pool:
+        futures = [pool.submit(fetch_forecast, 0, latitude, longitude, units, **api_call_arguments)
+                   for latitude, longitude in locations
+                   ]
+
+        results = []
+        for future in futures:
+            result, calls = future.result()
+            results.append(result)
+            api_calls += calls
+
+    return results, api_calls
+
+
+class LocationPages:
+    """The last good forecast of every location, with a frame for every view in every unit system
+    rendered ahead of time, so switching location, view or units only copies a frame and never
+    waits on the network. Every location has its own circuit breaker, so one failing location
+    doesn't hold back the others."""
+
+    def __init__(self, locations: list = None, units: str = UNIT_KIND, view: int = 0) -> None:
+        self.locations = list(LOCATIONS if locations is None else locations)
+        self.current = 0
+        self.view = view
+        self.units = UNIT_SYSTEMS.index(units)
+        self.last_good = [None] * len(self.locations)
+        self.stale = [False] * len(self.locations)
+        self.breakers = [CircuitBreaker() for _ in self.locations]
+        self.frames = numpy.zeros((len(self.locations), len(UNIT_SYSTEMS), len(VIEW_NAMES),
+                                   DISPLAY_WIDTH, DISPLAY_HEIGHT, 3
+                                   ),
+                                  dtype = numpy.uint8
+                                  )
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def load_snapshots(self) -> None:
+        """Start from the snapshot of every location that has one. The others stay blank."""
+        for index, location in enumerate(self.locations):
+            snapshot = load_snapshot(path = snapshot_path(index, location), location = location)
+            if snapshot is not None:
+                snapshot["weather"] = forecast_from_dict(snapshot["weather"])
+                if snapshot["weather"] is not None:
+                    self.last_good[index] = snapshot
+                    self.render(index)
+
+    def oldest_fetched_at(self) -> float:
+        """When the least recent forecast was fetched, or None if a location has none yet."""
+        if any(last_good is None for last_good in self.last_good):
+            return None
+        return min(last_good["fetched_at"] for last_good in self.last_good)
+
+    def fetchable(self, failing_only: bool = False) -> list:
+        """The indexes of the locations whose circuit breaker allows a fetch now. With
+        failing_only = True, only those whose last fetches failed, for retrying them without
+        spending calls on the others."""
+        return [index for index, breaker in enumerate(self.breakers)
+                if (breaker.consecutive_failures or not failing_only) and breaker.allow_request()
+                ]
+
+    def seconds_until_retry(self) -> float:
+        """How long until the soonest failing location should be fetched again, or None if none
+        are failing."""
+        waits = [breaker.seconds_until_retry() for breaker in self.breakers
+                 if breaker.consecutive_failures
+                 ]
+        return min(waits) if waits else None
+
+    def degraded_status(self) -> dict:
+        """The circuit breaker status of every failing location, for the logs."""
+        return {
+            self.locations[index]: breaker.status(None if self.last_good[index] is None
+                                                  else self.last_good[index]["fetched_at"])
+            for index, breaker in enumerate(self.breakers) if breaker.consecutive_failures
+            }
+
+    def update(self, results: list, indexes: list = None) -> list:
+        """Store the fetch_forecast results, one per location in indexes (every location by
+        default), and render their pages again. Failed locations keep their last good forecast,
+        marked as stale, and count towards their circuit breaker. Returns the errors."""
+        errors = []
+
+        if indexes is None:
+            indexes = range(len(self.locations))
+
+        for index, result in zip(indexes, results):
+            if result["result"] == "success":
+                self.breakers[index].record_success()
+                self.last_good[index] = {
+                    "fetched_at": time.time(),
+                    "weather"   : result["output"],
+                    }
+                self.stale[index] = False
+                save_snapshot(self.last_good[index]["weather"]._asdict(),
+                              self.last_good[index]["fetched_at"],
+                              snapshot_path(index, self.locations[index]),
+                              location = self.locations[index]
+                              )
+            else:
+                self.stale[index] = True
+                self.breakers[index].record_failure(result.get("error"))
+                errors.append(result.get("error"))
+
+            self.render(index)
+
+        return errors
+
+    def render(self, index: int) -> None:
+        """Draw every view of one location in every unit system, in the stale colours if its last
+        fetch failed. Values that can't be shown are printed once, in the units on screen, and
+        not at all while there is no forecast yet."""
+        weather = Forecast(*[None] * len(Forecast._fields))
+        if self.last_good[index] is not None:
+            weather = self.last_good[index]["weather"]
+
+        scheme = "stale" if self.stale[index] else "default"
+        for units_index, units in enumerate(UNIT_SYSTEMS):
+            converted = convert_forecast(weather, units)
+            report = self.last_good[index] is not None and units_index == self.units
+            for view_index, view in enumerate(VIEW_NAMES):
+                render_view(self.frames[index, units_index, view_index], converted, view, scheme,
+                            report
+                            )
+
+    def select(self, step: int) -> None:
+        """Move step locations forward (or back, if negative), wrapping around."""
+        self.current = (self.current + step) % len(self.locations)
+        print("Showing location {} of {}: {}".format(
+            self.current + 1, len(self.locations), self.locations[self.current]
+            )
+            )
+
+    def select_view(self, step: int) -> None:
+        """Move step views forward (or back, if negative), wrapping around."""
+        self.view = (self.view + step) % len(VIEW_NAMES)
+        print(f"Showing the {VIEW_NAMES[self.view]} view")
+
+    def select_units(self, step: int) -> None:
+        """Move step unit systems forward (or back, if negative), wrapping around."""
+        self.units = (self.units + step) % len(UNIT_SYSTEMS)
+        print(f"Showing {UNIT_SYSTEMS[self.units]} units")
+
+    def show(self, pixels: numpy.ndarray) -> None:
+        """Copy the current view of the current location, in the current units, into the
+        framebuffer."""
+        pixels[:] = self.frames[self.current, self.units, self.view]
@@ -1,28 +1,35 @@
 """Main Program"""
-import os
 import time
 from pprint import pprint
 
 from adjustable_settings import (SCREEN_BRIGHTNESS,
-                                 LOCATION_LATITUDE_,
-                                 UNIT_KIND,
-                                 LOCATION_LONGITUDE,
-                                 REFRESH_INTERVAL, TIME_DELAY)
-
-from datetime import datetime
-import pytz
+                                 REFRESH_INTERVAL,
+                                 ALIGN_REFRESH_TO_MINUTE,
+                                 HIDDEN_REFRESH_INTERVAL,
+                                 LOCATION_ROTATE_INTERVAL)
 
 from constants import (OPENWEATHER_API_KEY,
                        BUTTON_B,
                        BUTTON_A,
                        BUTTON_Y,
-                       BUTTON_X,
-                       GET_WEATHER_ENDPOINT, COLORS)
+                       BUTTON_X)
 from functions import (validate_environment_variables,
-                       test_numbers,
-                       unicornhatmini,
-                       api_call_to_json,
-                       display_number, clear_section)
+                       set_brightness,
+                       animation_clock,
+                       framebuffer,
+                       flush)
+from http_client import HTTP_CLIENT
+from rate_limiting import OPENWEATHER_RATE_LIMITER
+from locations import LocationPages, fetch_forecasts, locations_from
+from buttons import ButtonEvents, HELD
+from scheduler import DeadlineScheduler
+from state_timer import StateTimer
+from self_test import startup_test
+from settings_watcher import SettingsWatcher, imported_settings
+from units import UNIT_SYSTEMS
+
+# Delivered with the button presses when adjustable_settings.py has changed
+SETTINGS_EVENT = "settings"
 
 total_api_calls = 0
 
@@ -31,221 +38,317 @@ validate_environment_variables("weather-station",
                                    OPENWEATHER_API_KEY,
                                    ]
                                )
-try:
-    unicornhatmini.set_brightness(SCREEN_BRIGHTNESS)
-except AttributeError:
-    unicornhatmini.brightness(SCREEN_BRIGHTNESS)
-
-# Show all numbers as a welcome greeting and a diagnostic.
-test_numbers()
-
-# Set none of the buttons as pressed
-b_is_pressed = False
-a_is_pressed = False
-y_is_pressed = False
-x_is_pressed = False
-
-initial_run = True
-error_in_program = False
+set_brightness(SCREEN_BRIGHTNESS)
 
+# The last forecast we managed to fetch for every location, each rendered as a page. Shown,
+# marked as stale, while the API is failing.
+pages = LocationPages()
+pages.load_snapshots()
 
-def pressed_b() -> None:
-    """Run this when pressing the B (upper left) button on the Unicorn Hat Mini."""
-    global b_is_pressed
-    global initial_run
-
-    if b_is_pressed:
-        b_is_pressed = False
-        unicornhatmini.clear()
-        unicornhatmini.show()
-        initial_run = True
-
-    else:
-        b_is_pressed = True
+# Put the snapshot on the screen before anything else is set up, so a restart shows the forecast
+# straight away.
+pages.show(framebuffer.pixels)
+flush()
 
 
-def pressed_a() -> None:
-    """Run this when pressing the A (upper right) button on the Unicorn Hat Mini."""
-    global a_is_pressed
-    global initial_run
-
-    if a_is_pressed:
-        a_is_pressed = False
-        unicornhatmini.clear()
-        unicornhatmini.show()
-        initial_run = True
-    else:
-        a_is_pressed = True
+refresh_schedule = DeadlineScheduler(REFRESH_INTERVAL,
+                                     align_to = 60 if ALIGN_REFRESH_TO_MINUTE else None,
+                                     name = "refresh"
+                                     )
 
+# How often the forecast is still fetched while the display is hidden. None stops fetching.
+hidden_schedule = None
+if HIDDEN_REFRESH_INTERVAL is not None:
+    hidden_schedule = DeadlineScheduler(HIDDEN_REFRESH_INTERVAL, name = "hidden refresh")
 
-def pressed_y() -> None:
-    """Run this when pressing the Y (bottom left) button on the Unicorn Hat Mini."""
-    global y_is_pressed
-
-    if y_is_pressed:
-        y_is_pressed = False
-    else:
-        y_is_pressed = True
-
-
-def pressed_x() -> None:
-    """Hide/Show the clock when pressing the X (bottom right) button on the Unicorn Hat Mini."""
-    global x_is_pressed
-
-    if x_is_pressed:
-        x_is_pressed = False
-    else:
-        x_is_pressed = True
-
+# Switch to the next location on its own this often, if there is more than one.
+rotate_schedule = None
+if LOCATION_ROTATE_INTERVAL is not None and len(pages) > 1:
+    rotate_schedule = DeadlineScheduler(LOCATION_ROTATE_INTERVAL, name = "location rotation")
 
-while True:
-    datetime_now = datetime.now()
+state_timer = StateTimer("showing")
 
-    current_unix_time = int(time.mktime(datetime_now.timetuple()))
-    today_date_str = datetime_now.strftime("%d/%m/%Y")
 
-    BUTTON_B.when_pressed = pressed_b
-    BUTTON_A.when_pressed = pressed_a
-    BUTTON_Y.when_pressed = pressed_y
-    BUTTON_X.when_pressed = pressed_x
+def schedule_refresh_for(fetched_at: float) -> bool:
+    """Time the next refresh for when a forecast becomes a refresh interval old. Returns True if it
+    is due now. Uses the interval of refresh_schedule, which follows changes to REFRESH_INTERVAL."""
+    data_age = time.time() - fetched_at
+    refresh_schedule.start(refresh_schedule.interval - data_age)
+    return data_age >= refresh_schedule.interval
 
-    if x_is_pressed:
-        a_is_pressed = False
-        b_is_pressed = False
-        initial_run = True
 
-        time.sleep(TIME_DELAY)
-        unicornhatmini.clear()
+# If we were restarted recently, show the last forecasts straight away instead of fetching them.
+refresh_due = True
+retry_due = False
+if pages.oldest_fetched_at() is not None:
+    refresh_due = schedule_refresh_for(pages.oldest_fetched_at())
 
-        unicornhatmini.show()
-        continue
+if not refresh_due:
+    print("Warm start from a snapshot fetched {:.0f} seconds ago".format(
+        time.time() - pages.oldest_fetched_at()
+        )
+        )
 
-    raw_request, total_api_calls = api_call_to_json(method = "GET",
-                                                    name = "Weather Details",
-                                                    url = GET_WEATHER_ENDPOINT,
-                                                    api_calls = total_api_calls,
-                                                    params = {
-                                                        "lat"  : LOCATION_LATITUDE_,
-                                                        "lon"  : LOCATION_LONGITUDE,
-                                                        "appid": os.environ[OPENWEATHER_API_KEY],
-                                                        "units": UNIT_KIND,
-                                                        }
-                                                    )
+# Check the screen with a few test patterns, as set with STARTUP_TEST.
+startup_test()
 
-    if raw_request["result"] == "success":
-        weather = raw_request["output"]
-        current_feels_like = weather["current"].get("feels_like")
-        expected_feels_like = weather["hourly"][6].get("feels_like")
-        later_feels_like = weather["hourly"][12].get("feels_like")
+# Set none of the buttons as pressed
+x_is_pressed = False
 
-        # Clear the entire row
-        clear_section(0, 4, 0, 6)
 
-        # Display current temperature on top row
-        try:
-            temp_int = round(float(current_feels_like))
+def show_page() -> None:
+    """Show the pre-rendered page of the current location and view straight away."""
+    if not x_is_pressed:
+        pages.show(framebuffer.pixels)
+        flush()
 
-            if -100 < temp_int <= -10:
-                display_number(int(str(temp_int)[1]), 0, 0, rgb = COLORS["red"])
-                display_number(int(str(temp_int)[2]), 0, -4, rgb = COLORS["red"])
 
-            elif -10 < temp_int < 0:
-                display_number(int(str(temp_int)) * -1, 0, -2, rgb = COLORS["red"])
+def show_location(step: int) -> None:
+    """Switch location and show its page."""
+    pages.select(step)
+    if rotate_schedule is not None:
+        rotate_schedule.start()
+    show_page()
 
-            elif 0 <= temp_int < 10:
-                display_number(int(str(temp_int)[0]), 0, -2)
 
-            elif 10 < temp_int < 100:
-                display_number(int(str(temp_int)[0]), 0, 0)
-                display_number(int(str(temp_int)[1]), 0, -4)
+def pressed_b() -> None:
+    """Show the previous location when pressing the B (upper left) button on the Unicorn Hat
+    Mini."""
+    show_location(-1)
 
-            else:
-                raise ValueError
 
-        except (ValueError, IndexError):
-            print(f"Error: can't decipher value current_feels_like = {current_feels_like}")
-            display_number(0, 0, 0, rgb = COLORS["red"])
-            display_number(0, 0, -4, rgb = COLORS["red"])
+def pressed_a() -> None:
+    """Show the next location when pressing the A (upper right) button on the Unicorn Hat Mini."""
+    show_location(1)
 
-        # Display expected temperature on 2nd row
-        try:
-            temp_int = round(float(expected_feels_like))
 
-            if -100 < temp_int <= -10:
-                display_number(int(str(temp_int)[1]), 6, 0, rgb = COLORS["red"])
-                display_number(int(str(temp_int)[2]), 6, -4, rgb = COLORS["red"])
+def pressed_y() -> None:
+    """Show the next view (humidity, wind, ...) when pressing the Y (bottom left) button on the
+    Unicorn Hat Mini. Every view comes from the same fetch, so this never calls the API."""
+    pages.select_view(1)
+    show_page()
 
-            elif -10 < temp_int < 0:
-                display_number(int(str(temp_int)) * -1, 6, -2, rgb = COLORS["red"])
 
-            elif 0 <= temp_int < 10:
-                display_number(int(str(temp_int)[0]), 6, -2)
+def held_y() -> None:
+    """Switch between metric and imperial when holding the Y button down. The forecast is
+    converted locally, so this never calls the API either."""
+    pages.select_units(1)
+    show_page()
 
-            elif 10 < temp_int < 100:
-                display_number(int(str(temp_int)[0]), 6, 0)
-                display_number(int(str(temp_int)[1]), 6, -4)
 
-            else:
-                raise ValueError
+def pressed_x() -> None:
+    """Hide/Show the clock when pressing the X (bottom right) button on the Unicorn Hat Mini."""
+    global x_is_pressed
 
-        except (ValueError, IndexError):
-            print(f"Error: can't decipher value expected_feels_like = {expected_feels_like}")
-            display_number(0, 6, 0, rgb = COLORS["red"])
-            display_number(0, 6, -4, rgb = COLORS["red"])
+    if x_is_pressed:
+        x_is_pressed = False
+    else:
+        x_is_pressed = True
 
-        # Display later temperature on 3rd row
-        try:
-            temp_int = round(float(later_feels_like))
 
-            if -100 < temp_int <= -10:
-                display_number(int(str(temp_int)[1]), 12, 0, rgb = COLORS["red"])
-                display_number(int(str(temp_int)[2]), 12, -4, rgb = COLORS["red"])
+def fetch_weather(failing_only: bool = False) -> bool:
+    """Fetch the forecast of every location at once, leaving out those whose circuit breaker says
+    to wait, and render their pages. With failing_only = True, only the locations whose last
+    fetches failed are tried again. Returns True if every location tried was fetched."""
+    global total_api_calls
 
-            elif -10 < temp_int < 0:
-                display_number(int(str(temp_int)) * -1, 12, -2, rgb = COLORS["red"])
+    indexes = pages.fetchable(failing_only)
+    if not indexes:
+        print("Degraded: {}".format(pages.degraded_status()))
+        return False
 
-            elif 0 <= temp_int < 10:
-                display_number(int(str(temp_int)[0]), 12, -2)
+    raw_requests, total_api_calls = fetch_forecasts([pages.locations[index] for index in indexes],
+                                                    total_api_calls,
+                                                    rate_limiter = OPENWEATHER_RATE_LIMITER
+                                                    )
+    errors = pages.update(raw_requests, indexes)
+
+    latency = HTTP_CLIENT.latency_stats()
+    if latency["calls"]:
+        print("HTTP: {} calls, {} errors, last {:.0f} ms, mean {:.0f} ms, max {:.0f} ms".format(
+            latency["calls"],
+            latency["errors"],
+            latency["last_seconds"] * 1000,
+            latency["mean_seconds"] * 1000,
+            latency["max_seconds"] * 1000
+            )
+            )
+
+    if errors:
+        for raw_request in raw_requests:
+            if raw_request["result"] != "success":
+                pprint(raw_request)
+        print("Degraded: {}".format(pages.degraded_status()))
+        return False
+
+    return True
+
+
+def reload_settings() -> None:
+    """Apply the changes to adjustable_settings.py found by the settings watcher, touching only
+    what changed: a new brightness is just sent to the screen, and only a new location fetches
+    the forecast again."""
+    global pages
+    global rotate_schedule
+    global hidden_schedule
+
+    changes = settings_watcher.take_changes()
+    settings = settings_watcher.settings
+
+    if "SCREEN_BRIGHTNESS" in changes:
+        set_brightness(settings["SCREEN_BRIGHTNESS"])
+
+    if "TIME_DELAY" in changes:
+        animation_clock.interval = settings["TIME_DELAY"]
+
+    if "UNIT_KIND" in changes:
+        pages.units = UNIT_SYSTEMS.index(settings["UNIT_KIND"])
+
+    if "REFRESH_INTERVAL" in changes or "ALIGN_REFRESH_TO_MINUTE" in changes:
+        refresh_schedule.interval = settings["REFRESH_INTERVAL"]
+        refresh_schedule.align_to = 60 if settings["ALIGN_REFRESH_TO_MINUTE"] else None
+        if pages.oldest_fetched_at() is not None:
+            schedule_refresh_for(pages.oldest_fetched_at())
+
+    if changes.keys() & {"LOCATION_LATITUDE_", "LOCATION_LONGITUDE", "EXTRA_LOCATIONS"}:
+        pages = LocationPages(locations_from(settings["LOCATION_LATITUDE_"],
+                                             settings["LOCATION_LONGITUDE"],
+                                             settings["EXTRA_LOCATIONS"]
+                                             ),
+                              UNIT_SYSTEMS[pages.units],
+                              pages.view
+                              )
+        pages.load_snapshots()
+
+        # Fetch the new locations as soon as the main loop waits again.
+        refresh_schedule.start(0)
+
+    if changes.keys() & {"LOCATION_ROTATE_INTERVAL", "EXTRA_LOCATIONS"}:
+        rotate_schedule = None
+        if settings["LOCATION_ROTATE_INTERVAL"] is not None and len(pages) > 1:
+            rotate_schedule = DeadlineScheduler(settings["LOCATION_ROTATE_INTERVAL"],
+                                                name = "location rotation"
+                                                )
+
+    if "HIDDEN_REFRESH_INTERVAL" in changes:
+        hidden_schedule = None
+        if settings["HIDDEN_REFRESH_INTERVAL"] is not None:
+            hidden_schedule = DeadlineScheduler(settings["HIDDEN_REFRESH_INTERVAL"],
+                                                name = "hidden refresh"
+                                                )
+
+
+BUTTON_HANDLERS = {
+    "B": pressed_b,
+    "A": pressed_a,
+    "Y": pressed_y,
+    "X": pressed_x,
+    "Y" + HELD: held_y,
+    SETTINGS_EVENT: reload_settings,
+    }
+
+button_events = ButtonEvents({
+    "B": BUTTON_B,
+    "A": BUTTON_A,
+    "Y": BUTTON_Y,
+    "X": BUTTON_X,
+    },
+    holdable = ("Y",)
+    )
+
+# Pick up changes to adjustable_settings.py without a restart. They arrive like a button press.
+# Changes are found against the settings imported at startup, so edits saved while starting up
+# are picked up too.
+settings_watcher = SettingsWatcher(settings = imported_settings())
+settings_watcher.start(lambda: button_events.deliver(SETTINGS_EVENT))
 
-            elif 10 < temp_int < 100:
-                display_number(int(str(temp_int)[0]), 12, 0)
-                display_number(int(str(temp_int)[1]), 12, -4)
 
-            else:
-                raise ValueError
+while True:
+    if x_is_pressed:
+        # Blank the screen once when hiding, then stay idle.
+        if state_timer.state != "hidden":
+            state_timer.enter("hidden")
+            framebuffer.clear()
+            flush()
+            if hidden_schedule is not None:
+                hidden_schedule.start()
+
+        # Sleep until a button is pressed, only waking up to keep the forecast fresh in the
+        # background so it can be shown straight away.
+        timeout = None if hidden_schedule is None else hidden_schedule.seconds_until_due()
+        pressed_button = button_events.wait(timeout)
+
+        if pressed_button is not None:
+            BUTTON_HANDLERS[pressed_button]()
+        else:
+            hidden_schedule.tick()
+            fetch_weather()
+        continue
 
-        except (ValueError, IndexError):
-            print(f"Error: can't decipher value later_feels_like = {later_feels_like}")
-            display_number(0, 12, 0, rgb = COLORS["red"])
-            display_number(0, 12, -4, rgb = COLORS["red"])
+    if state_timer.state != "showing":
+        state_timer.enter("showing")
+        print("Time spent per state: {}".format(state_timer.report()))
+
+        # Show what we have straight away; only fetch first if there is nothing to show.
+        oldest_fetched_at = pages.oldest_fetched_at()
+        refresh_due = oldest_fetched_at is None or schedule_refresh_for(oldest_fetched_at)
+        if oldest_fetched_at is not None and refresh_due:
+            refresh_schedule.start(0)
+            refresh_due = False
+
+    if refresh_due:
+        fetch_weather()
+    elif retry_due:
+        fetch_weather(failing_only = True)
+    refresh_due = False
+    retry_due = False
+
+    # Copy the pre-rendered page of the current location into the framebuffer. It keeps showing
+    # the last good forecast, in the stale colours, while fetching fails. Only the pixels that
+    # end up different from what is already on screen get sent when flushing.
+    pages.show(framebuffer.pixels)
+
+    # Push all three rows to the screen in one go.
+    flush()
+
+    refresh_stats = framebuffer.report()
+    print("Refresh: {} pixels written, {} pixels and {} flushes saved".format(
+        refresh_stats["pixels_written"],
+        refresh_stats["pixels_skipped"],
+        refresh_stats["flushes_skipped"]
+        )
+        )
+
+    refresh_wait = refresh_schedule.seconds_until_due()
+
+    # After a failure, try again as soon as a circuit breaker allows instead of a full interval.
+    retry_wait = pages.seconds_until_retry()
+    if retry_wait is not None:
+        refresh_wait = min(refresh_wait, max(retry_wait, 1))
+
+    sleep_time = refresh_wait
+    if rotate_schedule is not None:
+        sleep_time = min(sleep_time, rotate_schedule.seconds_until_due())
+
+    # Sleep until the next refresh or location switch, waking up straight away if a button is
+    # pressed.
+    pressed_button = button_events.wait(sleep_time)
+    if pressed_button is not None:
+        BUTTON_HANDLERS[pressed_button]()
+
+    elif refresh_wait > sleep_time:
+        rotate_schedule.tick()
+        pages.select(1)
+
+    elif refresh_schedule.due():
+        refresh_due = True
+
+        tick = refresh_schedule.tick()
+        print("Refresh tick: {:.3f}s late, {} missed, next in {:.1f}s".format(
+            tick["lateness_seconds"], tick["missed"], tick["next_in_seconds"]
+            )
+            )
 
     else:
-        pprint(raw_request)
-        exit(1)
-
-    just_pressed = False
-    t = datetime.now(pytz.utc)
-    sleep_time = REFRESH_INTERVAL - t.second
-    for i in range(sleep_time * 20):
-        saved_b = b_is_pressed
-        saved_a = a_is_pressed
-        saved_y = y_is_pressed
-        saved_x = x_is_pressed
-
-        time.sleep(TIME_DELAY)
-
-        x_bool = saved_x != x_is_pressed
-        y_bool = saved_y != y_is_pressed
-        a_bool = saved_a != a_is_pressed
-        b_bool = saved_b != b_is_pressed
-        if x_bool or y_bool or a_bool or b_bool:
-            just_pressed = True
-            break
-
-    # Clear new screen pressed buttons if this not just pressed
-    # Allows a screen to reset to the main on its own at the next minute.
-    if not just_pressed:
-        a_is_pressed = False
-        b_is_pressed = False
-        unicornhatmini.clear()
-        initial_run = True
+        # Woken up to retry the failing locations; the others aren't due yet.
+        retry_due = True
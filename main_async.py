@@ -0,0 +1,226 @@
+"""Main Program, on asyncio
+
+The forecast is fetched in a worker thread ahead of every refresh deadline while the display and
+the buttons stay responsive, and the new forecast is swapped in all at once when it is due.
+Run this instead of main.py with: python3 main_async.py"""
+import asyncio
+import time
+from pprint import pprint
+
+from adjustable_settings import (SCREEN_BRIGHTNESS,
+                                 REFRESH_INTERVAL,
+                                 ALIGN_REFRESH_TO_MINUTE,
+                                 HIDDEN_REFRESH_INTERVAL,
+                                 UNIT_KIND)
+from constants import (OPENWEATHER_API_KEY,
+                       BUTTON_X,
+                       PREFETCH_LEAD_TIME)
+from functions import (validate_environment_variables,
+                       set_brightness,
+                       framebuffer,
+                       flush)
+from layout import render_forecast
+from units import convert_forecast
+from rate_limiting import OPENWEATHER_RATE_LIMITER
+from snapshot import load_snapshot, save_snapshot
+from weather import fetch_forecast_async, forecast_from_dict
+from circuit_breaker import CircuitBreaker
+from buttons import AsyncButtonEvents
+from scheduler import DeadlineScheduler
+from state_timer import StateTimer
+from self_test import startup_test
+
+
+class AsyncStation:
+    """The weather station's state, shared by the fetch, input and render tasks."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.total_api_calls = 0
+        self.breaker = CircuitBreaker()
+        self.refresh_schedule = DeadlineScheduler(
+            REFRESH_INTERVAL,
+            align_to = 60 if ALIGN_REFRESH_TO_MINUTE else None,
+            name = "refresh"
+            )
+        self.state_timer = StateTimer("showing")
+
+        # The forecast on screen: {"fetched_at", "weather"}. Only ever replaced as a whole.
+        self.last_good = load_snapshot()
+        if self.last_good is not None:
+            self.last_good["weather"] = forecast_from_dict(self.last_good["weather"])
+            if self.last_good["weather"] is None:
+                self.last_good = None
+
+        self.x_is_pressed = False
+
+        self.redraw = asyncio.Event()
+        self.shown = asyncio.Event()
+        self.shown.set()
+
+        self.buttons = AsyncButtonEvents({
+            "X": BUTTON_X,
+            },
+            loop
+            )
+
+    def schedule_refresh(self) -> bool:
+        """Time the next refresh for when the forecast on screen becomes REFRESH_INTERVAL old.
+        Returns True if it is due now."""
+        if self.last_good is None:
+            self.refresh_schedule.start(0)
+            return True
+
+        data_age = time.time() - self.last_good["fetched_at"]
+        self.refresh_schedule.start(REFRESH_INTERVAL - data_age)
+        return data_age >= REFRESH_INTERVAL
+
+    async def fetch(self):
+        """Fetch the forecast without blocking the event loop. Returns the new
+        {"fetched_at", "weather"}, or None if it failed or the circuit breaker says to wait."""
+        if not self.breaker.allow_request():
+            self.log_degraded()
+            return None
+
+        raw_request, self.total_api_calls = await fetch_forecast_async(
+            self.total_api_calls,
+            rate_limiter = OPENWEATHER_RATE_LIMITER
+            )
+
+        if raw_request["result"] != "success":
+            pprint(raw_request)
+            self.breaker.record_failure(raw_request.get("error"))
+            self.log_degraded()
+            return None
+
+        self.breaker.record_success()
+        forecast = {
+            "fetched_at": time.time(),
+            "weather"   : raw_request["output"],
+            }
+        await asyncio.to_thread(save_snapshot,
+                                forecast["weather"]._asdict(),
+                                forecast["fetched_at"]
+                                )
+        return forecast
+
+    def log_degraded(self) -> None:
+        """Log the circuit breaker's state while fetching fails."""
+        print("Degraded: {}".format(
+            self.breaker.status(None if self.last_good is None else self.last_good["fetched_at"])
+            )
+            )
+
+    async def fetch_loop(self) -> None:
+        """Fetch the forecast PREFETCH_LEAD_TIME before each refresh deadline, and swap it in at
+        the deadline."""
+        while True:
+            if self.x_is_pressed:
+                # Hidden: only fetch every HIDDEN_REFRESH_INTERVAL, so showing it again is instant.
+                try:
+                    await asyncio.wait_for(self.shown.wait(), HIDDEN_REFRESH_INTERVAL)
+                except asyncio.TimeoutError:
+                    forecast = await self.fetch()
+                    if forecast is not None:
+                        self.last_good = forecast
+                continue
+
+            await asyncio.sleep(max(self.refresh_schedule.seconds_until_due() - PREFETCH_LEAD_TIME,
+                                    0
+                                    )
+                                )
+            if self.x_is_pressed:
+                continue
+
+            forecast = await self.fetch()
+
+            if forecast is None:
+                # Show the old forecast as stale, and try again when the breaker allows.
+                self.redraw.set()
+                await asyncio.sleep(max(self.breaker.seconds_until_retry(), 1))
+                continue
+
+            # Hold on to the new forecast until it is due, then swap it in all at once.
+            await asyncio.sleep(self.refresh_schedule.seconds_until_due())
+            self.last_good = forecast
+            self.redraw.set()
+
+            tick = self.refresh_schedule.tick()
+            print("Refresh tick: {:.3f}s late, {} missed, next in {:.1f}s".format(
+                tick["lateness_seconds"], tick["missed"], tick["next_in_seconds"]
+                )
+                )
+
+    async def input_loop(self) -> None:
+        """Handle button presses as they come in."""
+        while True:
+            self.handle_press(await self.buttons.next_press())
+            self.redraw.set()
+
+    def handle_press(self, name: str) -> None:
+        """X hides and shows the display. Only X is used here; switching locations, views and
+        units with the other buttons is in main.py."""
+        if name == "X":
+            self.x_is_pressed = not self.x_is_pressed
+
+            if self.x_is_pressed:
+                self.state_timer.enter("hidden")
+                self.shown.clear()
+            else:
+                self.state_timer.enter("showing")
+                print("Time spent per state: {}".format(self.state_timer.report()))
+                self.schedule_refresh()
+                self.shown.set()
+
+    async def render_loop(self) -> None:
+        """Redraw the display whenever something changed."""
+        while True:
+            await self.redraw.wait()
+            self.redraw.clear()
+
+            # Take the forecast once, so a swap halfway through a frame can't mix two of them.
+            last_good = self.last_good
+
+            # Hidden, or nothing fetched yet: leave the screen blank.
+            if self.x_is_pressed or last_good is None:
+                framebuffer.clear()
+            else:
+                color_scheme = "stale" if self.breaker.consecutive_failures else "default"
+                render_forecast(framebuffer.pixels,
+                                convert_forecast(last_good["weather"], UNIT_KIND),
+                                color_scheme
+                                )
+
+            flush()
+
+
+async def run() -> None:
+    """Start the weather station."""
+    validate_environment_variables("weather-station",
+                                   [
+                                       OPENWEATHER_API_KEY,
+                                       ]
+                                   )
+    set_brightness(SCREEN_BRIGHTNESS)
+
+    station = AsyncStation(asyncio.get_running_loop())
+
+    # If we were restarted recently, show the last forecast straight away instead of fetching it.
+    cold_start = station.schedule_refresh()
+    fetcher = asyncio.create_task(station.fetch_loop())
+
+    if not cold_start:
+        print("Warm start from a snapshot fetched {:.0f} seconds ago".format(
+            time.time() - station.last_good["fetched_at"]
+            )
+            )
+
+    # Check the screen with a few test patterns, as set with STARTUP_TEST, while the first fetch
+    # runs.
+    await asyncio.to_thread(startup_test)
+
+    station.redraw.set()
+    await asyncio.gather(fetcher, station.input_loop(), station.render_loop())
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
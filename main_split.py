@@ -0,0 +1,239 @@
+"""Main Program, split into two processes
+
+A fetcher process fetches and parses the forecast and renders the frame, then publishes both
+through shared memory. This process only owns the Unicorn Hat Mini and the buttons, and copies
+the latest frame to the screen, so a crash or stall on the network side never freezes the LEDs.
+Run this instead of main.py with: python3 main_split.py"""
+import multiprocessing
+import threading
+import time
+from pprint import pprint
+
+import numpy
+
+from adjustable_settings import (SCREEN_BRIGHTNESS,
+                                 REFRESH_INTERVAL,
+                                 ALIGN_REFRESH_TO_MINUTE,
+                                 UNIT_KIND)
+from constants import (OPENWEATHER_API_KEY,
+                       BUTTON_B,
+                       BUTTON_A,
+                       BUTTON_Y,
+                       BUTTON_X,
+                       FETCHER_HEARTBEAT_INTERVAL,
+                       FETCHER_STALL_TIMEOUT)
+from functions import (validate_environment_variables,
+                       set_brightness,
+                       framebuffer,
+                       flush)
+from layout import render_forecast
+from units import convert_forecast
+from rate_limiting import OPENWEATHER_RATE_LIMITER
+from snapshot import load_snapshot, save_snapshot
+from weather import Forecast, fetch_forecast, forecast_from_dict
+from circuit_breaker import CircuitBreaker
+from buttons import ButtonEvents
+from scheduler import DeadlineScheduler
+from shared_frame import SharedFrame, FRAME_SHAPE
+from self_test import startup_test
+
+# Delivered with the button presses when the fetcher has published a new frame
+FRAME_EVENT = "frame"
+
+# fork keeps the already imported modules, so the fetcher doesn't set up the hardware again.
+CONTEXT = multiprocessing.get_context("fork")
+
+
+def load_last_good():
+    """The snapshot of the last good forecast as {"fetched_at", "weather"}, or None."""
+    last_good = load_snapshot()
+    if last_good is not None:
+        last_good["weather"] = forecast_from_dict(last_good["weather"])
+        if last_good["weather"] is None:
+            return None
+    return last_good
+
+
+def run_fetcher(shared_name: str, published, stop) -> None:
+    """The fetcher process: fetch the forecast when it is due, render it and publish it."""
+    shared = SharedFrame.attach(shared_name)
+    breaker = CircuitBreaker()
+    refresh_schedule = DeadlineScheduler(REFRESH_INTERVAL,
+                                         align_to = 60 if ALIGN_REFRESH_TO_MINUTE else None,
+                                         name = "refresh"
+                                         )
+    frame = numpy.zeros(FRAME_SHAPE, dtype = numpy.uint8)
+    total_api_calls = 0
+
+    def publish(forecast: dict, stale: bool) -> None:
+        weather = Forecast(None, None, None) if forecast is None else forecast["weather"]
+        render_forecast(frame, convert_forecast(weather, UNIT_KIND),
+                        "stale" if stale else "default"
+                        )
+        shared.publish(weather, frame, 0 if forecast is None else forecast["fetched_at"], stale)
+        published.set()
+
+    # Publish the snapshot straight away, and only fetch once it is out of date.
+    last_good = load_last_good()
+    if last_good is None:
+        refresh_schedule.start(0)
+    else:
+        refresh_schedule.start(REFRESH_INTERVAL - (time.time() - last_good["fetched_at"]))
+        publish(last_good, stale = False)
+
+    retry_at = None
+    renderer = multiprocessing.parent_process()
+
+    try:
+        while not stop.is_set():
+            # Don't outlive the renderer if it was killed without stopping us.
+            if renderer is not None and not renderer.is_alive():
+                break
+
+            shared.heartbeat()
+
+            wait = refresh_schedule.seconds_until_due()
+            if retry_at is not None:
+                wait = min(wait, max(retry_at - time.monotonic(), 0))
+
+            if wait > 0:
+                stop.wait(min(wait, FETCHER_HEARTBEAT_INTERVAL))
+                continue
+
+            if refresh_schedule.due():
+                refresh_schedule.tick()
+
+            retry_at = None
+
+            if breaker.allow_request():
+                raw_request, total_api_calls = fetch_forecast(
+                    total_api_calls,
+                    rate_limiter = OPENWEATHER_RATE_LIMITER
+                    )
+                if raw_request["result"] == "success":
+                    breaker.record_success()
+                    last_good = {
+                        "fetched_at": time.time(),
+                        "weather"   : raw_request["output"],
+                        }
+                    save_snapshot(last_good["weather"]._asdict(), last_good["fetched_at"])
+                else:
+                    pprint(raw_request)
+                    breaker.record_failure(raw_request.get("error"))
+
+            if breaker.consecutive_failures:
+                print("Degraded: {}".format(
+                    breaker.status(None if last_good is None else last_good["fetched_at"])
+                    )
+                    )
+                retry_at = time.monotonic() + max(breaker.seconds_until_retry(), 1)
+
+            publish(last_good, stale = bool(breaker.consecutive_failures))
+
+    finally:
+        shared.close()
+
+
+def start_fetcher(shared: SharedFrame, published, stop):
+    """Start a new fetcher process."""
+    fetcher = CONTEXT.Process(target = run_fetcher,
+                              args = (shared.name, published, stop),
+                              name = "weather-fetcher",
+                              daemon = True
+                              )
+    fetcher.start()
+    print(f"Started fetcher process {fetcher.pid}")
+    return fetcher
+
+
+def fetcher_is_healthy(fetcher, shared: SharedFrame) -> bool:
+    """False if the fetcher process died or hasn't shown signs of life for too long."""
+    if not fetcher.is_alive():
+        print(f"Fetcher process exited with code {fetcher.exitcode}")
+        return False
+
+    since_heartbeat = shared.seconds_since_heartbeat()
+    if since_heartbeat is not None and since_heartbeat > FETCHER_STALL_TIMEOUT:
+        print(f"Fetcher process stalled, no heartbeat for {since_heartbeat:.0f}s")
+        fetcher.kill()
+        fetcher.join()
+        return False
+
+    return True
+
+
+def run() -> None:
+    """The renderer process: copy published frames to the screen and handle the buttons."""
+    validate_environment_variables("weather-station",
+                                   [
+                                       OPENWEATHER_API_KEY,
+                                       ]
+                                   )
+    set_brightness(SCREEN_BRIGHTNESS)
+
+    shared = SharedFrame.create()
+    published = CONTEXT.Event()
+    stop = CONTEXT.Event()
+    fetcher = start_fetcher(shared, published, stop)
+
+    # Check the screen with a few test patterns, as set with STARTUP_TEST, while the first fetch
+    # runs.
+    startup_test()
+
+    button_events = ButtonEvents({
+        "B": BUTTON_B,
+        "A": BUTTON_A,
+        "Y": BUTTON_Y,
+        "X": BUTTON_X,
+        }
+        )
+
+    def forward_published_frames() -> None:
+        while True:
+            published.wait()
+            published.clear()
+            button_events.deliver(FRAME_EVENT)
+
+    threading.Thread(target = forward_published_frames,
+                     name = "frame-events",
+                     daemon = True
+                     ).start()
+
+    hidden = False
+    last_sequence = None
+
+    try:
+        while True:
+            if not fetcher_is_healthy(fetcher, shared):
+                fetcher = start_fetcher(shared, published, stop)
+
+            if hidden:
+                framebuffer.clear()
+            else:
+                latest = shared.read()
+                if latest is not None:
+                    framebuffer.pixels[:] = latest["frame"]
+                    if latest["sequence"] != last_sequence:
+                        last_sequence = latest["sequence"]
+                        print("Showing frame {} (forecast {}{})".format(
+                            last_sequence, latest["forecast"], ", stale" if latest["stale"] else ""
+                            )
+                            )
+
+            flush()
+
+            # Sleep until a new frame or a button press, checking on the fetcher now and then.
+            event = button_events.wait(FETCHER_HEARTBEAT_INTERVAL)
+            if event == "X":
+                hidden = not hidden
+
+    finally:
+        stop.set()
+        fetcher.join(timeout = 5)
+        if fetcher.is_alive():
+            fetcher.kill()
+        shared.close()
+
+
+if __name__ == "__main__":
+    run()
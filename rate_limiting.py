@@ -0,0 +1,126 @@
+"""Define the retry policy and the rate limiter that keep API calls within their limits"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from constants import (RETRY_MAX_ATTEMPTS,
+                       RETRY_BASE_DELAY,
+                       RETRY_MAX_DELAY,
+                       RETRY_STATUS_CODES,
+                       OPENWEATHER_DAILY_QUOTA,
+                       OPENWEATHER_BURST_SIZE)
+
+
+def parse_retry_after(value) -> float:
+    """Turn a Retry-After header (seconds or an HTTP date) into seconds to wait, or None if it
+    can't be read."""
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo = timezone.utc)
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Decide whether a failed call is tried again and how long to wait first.
+
+    The wait doubles every attempt (capped exponential backoff) with full jitter, unless the
+    server asks for a specific wait with Retry-After."""
+
+    def __init__(self,
+                 max_attempts: int = RETRY_MAX_ATTEMPTS,
+                 base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY,
+                 retry_status_codes: tuple = RETRY_STATUS_CODES,
+                 jitter: bool = True
+                 ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_status_codes = retry_status_codes
+        self.jitter = jitter
+
+    def should_retry(self, status_code: int, attempt: int) -> bool:
+        """True if a response with this status code, on this attempt (starting at 1), should be
+        tried again."""
+        return status_code in self.retry_status_codes and attempt < self.max_attempts
+
+    def delay(self, attempt: int, retry_after = None) -> float:
+        """Seconds to wait before the next attempt, or None if the server asked us to wait longer
+        than max_delay and we should give up instead."""
+        retry_after_seconds = parse_retry_after(retry_after)
+
+        if retry_after_seconds is not None:
+            if retry_after_seconds > self.max_delay:
+                return None
+            return retry_after_seconds
+
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+        if self.jitter:
+            return random.uniform(0, backoff)
+        return backoff
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how many calls are made over time.
+
+    Tokens refill continuously at rate_per_second up to capacity; every call takes one."""
+
+    def __init__(self, rate_per_second: float, capacity: float) -> None:
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.denied = 0
+        self.lock = threading.Lock()
+
+    def refill(self) -> None:
+        """Add the tokens earned since the last refill. Must be called holding the lock."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take tokens if there are enough, without waiting."""
+        with self.lock:
+            self.refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            self.denied += 1
+            return False
+
+    def seconds_until_available(self, tokens: float = 1) -> float:
+        """How long until the given number of tokens can be taken."""
+        with self.lock:
+            self.refill()
+            missing = tokens - self.tokens
+            if missing <= 0:
+                return 0.0
+            return missing / self.rate_per_second
+
+
+def daily_quota_bucket(calls_per_day: int = OPENWEATHER_DAILY_QUOTA,
+                       burst_size: int = OPENWEATHER_BURST_SIZE
+                       ) -> TokenBucket:
+    """A token bucket that keeps calls under a daily quota, allowing short bursts."""
+    return TokenBucket(calls_per_day / (24 * 60 * 60), burst_size)
+
+
+# Shared by every caller of the OpenWeather API.
+OPENWEATHER_RATE_LIMITER = daily_quota_bucket()
@@ -0,0 +1,105 @@
+"""Define the deadline scheduler driving the refreshes and the animation frames"""
+import math
+import time
+
+# How far past a boundary a deadline may be and still count as on it, so the float noise in
+# converting between clocks doesn't push a deadline to the next boundary.
+ALIGN_TOLERANCE = 0.01
+
+
+class DeadlineScheduler:
+    """Keep absolute deadlines every interval seconds on the monotonic clock.
+
+    Each deadline is the previous one plus the interval, however long the work in between took,
+    so the period doesn't drift. With align_to, deadlines land on wall clock boundaries of that
+    many seconds, e.g. align_to = 60 refreshes on the minute. Every tick records how late it was."""
+
+    def __init__(self, interval: float, align_to: float = None, name: str = "scheduler") -> None:
+        self.interval = interval
+        self.align_to = align_to
+        self.name = name
+        self.deadline = None
+        self.stats = {
+            "ticks"          : 0,
+            "missed"         : 0,
+            "total_lateness" : 0.0,
+            "max_lateness"   : 0.0,
+            "last_lateness"  : None,
+            }
+
+    def align(self, deadline: float) -> float:
+        """Move a monotonic deadline to the next wall clock boundary, so it is never earlier than
+        asked for."""
+        if not self.align_to:
+            return deadline
+
+        wall_clock_offset = time.time() - time.monotonic()
+        wall_deadline = deadline + wall_clock_offset
+        aligned = math.ceil((wall_deadline - ALIGN_TOLERANCE) / self.align_to) * self.align_to
+        return aligned - wall_clock_offset
+
+    def start(self, delay: float = None) -> None:
+        """Set the first deadline delay seconds from now, one interval from now by default. A delay
+        of 0 or less makes it due straight away, without waiting for a boundary."""
+        if delay is None:
+            delay = self.interval
+
+        if delay <= 0:
+            self.deadline = time.monotonic()
+            return
+
+        self.deadline = self.align(time.monotonic() + delay)
+
+    def seconds_until_due(self) -> float:
+        """Seconds left until the next deadline, 0 if it has passed."""
+        if self.deadline is None:
+            self.start()
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def due(self) -> bool:
+        """True if the deadline has been reached."""
+        return self.seconds_until_due() == 0
+
+    def tick(self) -> dict:
+        """Record that the deadline was handled and move on to the next one. Deadlines that were
+        missed entirely are skipped, not caught up on."""
+        if self.deadline is None:
+            self.start(0)
+
+        now = time.monotonic()
+        lateness = max(now - self.deadline, 0.0)
+
+        next_deadline = self.deadline + self.interval
+        missed = 0
+        while next_deadline <= now:
+            next_deadline += self.interval
+            missed += 1
+
+        self.deadline = self.align(next_deadline)
+
+        # Alignment can round a deadline back into the past; never schedule one we can't make.
+        if self.deadline <= now:
+            self.deadline += self.interval
+
+        self.stats["ticks"] += 1
+        self.stats["missed"] += missed
+        self.stats["total_lateness"] += lateness
+        self.stats["max_lateness"] = max(self.stats["max_lateness"], lateness)
+        self.stats["last_lateness"] = lateness
+
+        return {
+            "lateness_seconds": lateness,
+            "missed"          : missed,
+            "next_in_seconds" : self.deadline - now,
+            }
+
+    def sleep(self) -> dict:
+        """Sleep until the deadline, then tick."""
+        time.sleep(self.seconds_until_due())
+        return self.tick()
+
+    def jitter_stats(self) -> dict:
+        """The lateness stats, including the mean lateness per tick."""
+        stats = dict(self.stats)
+        stats["mean_lateness"] = stats["total_lateness"] / stats["ticks"] if stats["ticks"] else None
+        return stats
@@ -0,0 +1,113 @@
+"""Define the startup self-test: a few full-frame patterns that check every LED in a fraction of a
+second"""
+import time
+
+import numpy
+
+from adjustable_settings import STARTUP_TEST
+from constants import COLORS, SELF_TEST_FRAME_TIME, BOOT_ID_PATH, BOOT_MARKER_PATH
+from framebuffer import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from functions import framebuffer, flush, test_numbers
+from glyphs import GLYPHS
+
+# Every channel of every LED at full brightness, one at a time and then all together
+CHANNEL_PATTERNS = {
+    "red"  : (255, 0, 0),
+    "green": (0, 255, 0),
+    "blue" : (0, 0, 255),
+    "white": (255, 255, 255),
+    }
+
+# Where the glyphs go on the glyph sheet, the same places test_numbers() draws them
+GLYPH_SHEET_OFFSETS = ((0, 0), (6, 0), (12, 0), (0, -4), (6, -4), (12, -4))
+
+
+def test_patterns() -> list:
+    """The (name, frame) patterns of the self-test: each colour channel and white on every LED,
+    a checkerboard and its inverse, and every digit on a glyph sheet."""
+    shape = (DISPLAY_WIDTH, DISPLAY_HEIGHT, 3)
+    patterns = []
+
+    for name, rgb in CHANNEL_PATTERNS.items():
+        frame = numpy.zeros(shape, dtype = numpy.uint8)
+        frame[:] = rgb
+        patterns.append((name, frame))
+
+    x, y = numpy.indices((DISPLAY_WIDTH, DISPLAY_HEIGHT))
+    checkerboard = (x + y) % 2 == 0
+    for name, lit in (("checkerboard", checkerboard), ("inverse checkerboard", ~checkerboard)):
+        frame = numpy.zeros(shape, dtype = numpy.uint8)
+        frame[lit] = COLORS["white"]
+        patterns.append((name, frame))
+
+    digits = list(range(len(GLYPHS.masks)))
+    for sheet in range(0, len(digits), len(GLYPH_SHEET_OFFSETS)):
+        frame = numpy.zeros(shape, dtype = numpy.uint8)
+        for digit, (x_offset, y_offset) in zip(digits[sheet:], GLYPH_SHEET_OFFSETS):
+            GLYPHS.blit(frame, digit, x_offset, y_offset, COLORS["white"])
+        patterns.append((f"glyph sheet {sheet // len(GLYPH_SHEET_OFFSETS) + 1}", frame))
+
+    return patterns
+
+
+def run_self_test(frame_time: float = SELF_TEST_FRAME_TIME) -> dict:
+    """Show every test pattern for frame_time seconds, then clear the screen. Returns how many
+    patterns were shown and how long it took."""
+    start = time.perf_counter()
+    patterns = test_patterns()
+
+    for _, frame in patterns:
+        framebuffer.pixels[:] = frame
+        flush()
+        time.sleep(frame_time)
+
+    framebuffer.clear()
+    flush()
+
+    result = {
+        "patterns": len(patterns),
+        "seconds" : time.perf_counter() - start,
+        }
+    print("Self-test: {} patterns in {:.0f} ms".format(result["patterns"],
+                                                       result["seconds"] * 1000
+                                                       )
+          )
+    return result
+
+
+def is_cold_boot(boot_id_path: str = BOOT_ID_PATH, marker_path: str = BOOT_MARKER_PATH) -> bool:
+    """True the first time this is called since the computer booted; False after a restart of the
+    program. Assumes a cold boot if the boot can't be identified."""
+    try:
+        with open(boot_id_path) as boot_id_file:
+            boot_id = boot_id_file.read().strip()
+    except OSError:
+        return True
+
+    try:
+        with open(marker_path) as marker_file:
+            if marker_file.read().strip() == boot_id:
+                return False
+    except OSError:
+        pass
+
+    try:
+        with open(marker_path, "w") as marker_file:
+            marker_file.write(boot_id)
+    except OSError as e:
+        print(f"self_test: could not save the boot id to {marker_path}: {repr(e)}")
+
+    return True
+
+
+def startup_test(mode: str = STARTUP_TEST) -> dict:
+    """Run the startup test chosen in adjustable_settings. Returns the result of the self-test,
+    or None if it didn't run."""
+    if mode == "numbers":
+        test_numbers()
+        return None
+
+    if mode == "always" or (mode == "cold_boot" and is_cold_boot()):
+        return run_self_test()
+
+    return None
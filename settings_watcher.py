@@ -0,0 +1,176 @@
+"""Define the watcher that picks up changes to adjustable_settings.py while the station runs"""
+import os
+import runpy
+import threading
+
+import adjustable_settings
+from constants import SETTINGS_CHECK_INTERVAL, NUMBERS_TO_DRAW_BY_LANGUAGE
+from units import UNIT_SYSTEMS
+
+SETTINGS_PATH = adjustable_settings.__file__
+
+# Settings that are only read at startup, so changing them still needs a restart
+RESTART_SETTINGS = ("LANGUAGE", "ANIMATE_DRAWING", "STARTUP_TEST")
+
+STARTUP_TEST_MODES = ("cold_boot", "always", "never", "numbers")
+
+
+def read_settings(path: str = SETTINGS_PATH) -> dict:
+    """Run a settings file and return its settings (the upper case names) as a dict."""
+    return {name: value for name, value in runpy.run_path(path).items() if name.isupper()}
+
+
+def imported_settings() -> dict:
+    """The settings as they were when adjustable_settings was imported."""
+    return {name: value for name, value in vars(adjustable_settings).items() if name.isupper()}
+
+
+def is_number(value) -> bool:
+    """True for an int or a float, but not a bool."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_settings(settings: dict) -> list:
+    """Return what is wrong with the settings, as a list of messages. Empty if they are fine."""
+    problems = []
+
+    def check(name: str, valid: bool, expected: str) -> None:
+        if name not in settings:
+            problems.append(f"{name} is missing")
+        elif not valid:
+            problems.append(f"{name} should be {expected}, not {settings[name]!r}")
+
+    def number_between(name: str, low: float, high: float) -> bool:
+        value = settings.get(name)
+        return is_number(value) and low <= value <= high
+
+    def positive_or_none(name: str) -> bool:
+        value = settings.get(name)
+        return value is None or (is_number(value) and value > 0)
+
+    def locations(value) -> bool:
+        try:
+            return all(len(location) == 2
+                       and is_number(location[0]) and -90 <= location[0] <= 90
+                       and is_number(location[1]) and -180 <= location[1] <= 180
+                       for location in value
+                       )
+        except TypeError:
+            return False
+
+    check("LOCATION_LATITUDE_", number_between("LOCATION_LATITUDE_", -90, 90),
+          "between -90 and 90")
+    check("LOCATION_LONGITUDE", number_between("LOCATION_LONGITUDE", -180, 180),
+          "between -180 and 180")
+    check("EXTRA_LOCATIONS", locations(settings.get("EXTRA_LOCATIONS")),
+          "a list of (latitude, longitude) pairs")
+    check("LOCATION_ROTATE_INTERVAL", positive_or_none("LOCATION_ROTATE_INTERVAL"),
+          "a positive number of seconds or None")
+    check("LANGUAGE", settings.get("LANGUAGE") in NUMBERS_TO_DRAW_BY_LANGUAGE,
+          "one of {}".format(", ".join(NUMBERS_TO_DRAW_BY_LANGUAGE)))
+    check("UNIT_KIND", settings.get("UNIT_KIND") in UNIT_SYSTEMS,
+          "one of {}".format(", ".join(UNIT_SYSTEMS)))
+    check("TIME_DELAY", number_between("TIME_DELAY", 0, 10), "between 0 and 10 seconds")
+    check("REFRESH_INTERVAL", number_between("REFRESH_INTERVAL", 1, 24 * 60 * 60),
+          "between 1 second and a day")
+    check("ALIGN_REFRESH_TO_MINUTE", isinstance(settings.get("ALIGN_REFRESH_TO_MINUTE"), bool),
+          "True or False")
+    check("HIDDEN_REFRESH_INTERVAL", positive_or_none("HIDDEN_REFRESH_INTERVAL"),
+          "a positive number of seconds or None")
+    check("STARTUP_TEST", settings.get("STARTUP_TEST") in STARTUP_TEST_MODES,
+          "one of {}".format(", ".join(STARTUP_TEST_MODES)))
+    check("ANIMATE_DRAWING", isinstance(settings.get("ANIMATE_DRAWING"), bool), "True or False")
+    check("SCREEN_BRIGHTNESS", number_between("SCREEN_BRIGHTNESS", 0, 1), "between 0 and 1")
+
+    return problems
+
+
+class SettingsWatcher:
+    """Check the modification time of the settings file every interval seconds, and re-read it
+    when it changes. Only changes to valid settings are passed on; a file with mistakes in it is
+    reported and ignored until it is fixed.
+
+    If settings are given, such as imported_settings(), changes are found against them, and the
+    first check always re-reads the file, so edits saved since they were read aren't missed.
+    Otherwise the file as it is now is the starting point."""
+
+    def __init__(self, path: str = SETTINGS_PATH, interval: float = SETTINGS_CHECK_INTERVAL,
+                 settings: dict = None
+                 ) -> None:
+        self.path = path
+        self.interval = interval
+        if settings is None:
+            self.settings = read_settings(path)
+            self.modified = self.modified_time()
+        else:
+            self.settings = dict(settings)
+            self.modified = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def modified_time(self) -> int:
+        """The modification time of the settings file in nanoseconds, or None if it is gone."""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def check(self) -> dict:
+        """Re-read the settings if the file changed. Returns {name: new value} for every setting
+        that changed, or {} if nothing did or the new settings are not valid."""
+        modified = self.modified_time()
+        if modified is None or modified == self.modified:
+            return {}
+        self.modified = modified
+
+        try:
+            settings = read_settings(self.path)
+        except Exception as e:
+            print(f"settings: ignoring {self.path} until it can be read: {repr(e)}")
+            return {}
+
+        problems = validate_settings(settings)
+        if problems:
+            print("settings: ignoring {} until it is fixed: {}".format(self.path,
+                                                                       "; ".join(problems)
+                                                                       )
+                  )
+            return {}
+
+        changes = {name: value
+                   for name, value in settings.items()
+                   if name not in self.settings or self.settings[name] != value
+                   }
+        self.settings = settings
+
+        if changes:
+            print(f"settings: changed {changes}")
+            for name in RESTART_SETTINGS:
+                if name in changes:
+                    print(f"settings: {name} only takes effect after a restart")
+
+        return changes
+
+    def start(self, notify) -> None:
+        """Check for changes on a background thread, calling notify() whenever there are some to
+        pick up with take_changes()."""
+        def watch() -> None:
+            while not self.stopped.wait(self.interval):
+                changes = self.check()
+                if changes:
+                    with self.lock:
+                        self.pending.update(changes)
+                    notify()
+
+        threading.Thread(target = watch, name = "settings-watcher", daemon = True).start()
+
+    def take_changes(self) -> dict:
+        """The changes found since the last call."""
+        with self.lock:
+            changes, self.pending = self.pending, {}
+        return changes
+
+    def stop(self) -> None:
+        """Stop checking for changes."""
+        self.stopped.set()
@@ -0,0 +1,131 @@
+"""Define the frame and readings shared between the fetcher and renderer processes"""
+import time
+from multiprocessing import shared_memory
+
+import numpy
+
+from framebuffer import DISPLAY_WIDTH, DISPLAY_HEIGHT
+from units import as_float
+from weather import Forecast
+
+# Layout of the shared memory block:
+#   uint64                  sequence, odd while the fetcher is writing
+#   float64 x (4 + fields)  heartbeat, fetched_at, stale, published, then one per Forecast field
+#   uint8 x width x height x 3  the rendered frame
+SEQUENCE_BYTES = 8
+HEARTBEAT, FETCHED_AT, STALE, PUBLISHED = range(4)
+VALUES = 4 + len(Forecast._fields)
+VALUES_BYTES = VALUES * 8
+FRAME_SHAPE = (DISPLAY_WIDTH, DISPLAY_HEIGHT, 3)
+SHARED_FRAME_BYTES = SEQUENCE_BYTES + VALUES_BYTES + int(numpy.prod(FRAME_SHAPE))
+
+# How many times a reader tries again when it catches the writer halfway through
+READ_ATTEMPTS = 100
+
+
+class SharedFrame:
+    """The latest readings and rendered frame, in shared memory and guarded by a sequence counter.
+
+    There is one writer (the fetcher). It makes the sequence odd, writes, then makes it even
+    again. Readers copy everything out and only keep the copy if the sequence was even and didn't
+    change meanwhile, so they never block the writer or see half a frame."""
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool) -> None:
+        self.memory = memory
+        self.owner = owner
+        self.sequence = numpy.ndarray((1,), dtype = numpy.uint64, buffer = memory.buf)
+        self.values = numpy.ndarray((VALUES,), dtype = numpy.float64, buffer = memory.buf,
+                                    offset = SEQUENCE_BYTES
+                                    )
+        self.frame = numpy.ndarray(FRAME_SHAPE, dtype = numpy.uint8, buffer = memory.buf,
+                                   offset = SEQUENCE_BYTES + VALUES_BYTES
+                                   )
+
+    @classmethod
+    def create(cls, name: str = None) -> "SharedFrame":
+        """Create a new, empty shared frame. The creator removes it with unlink()."""
+        memory = shared_memory.SharedMemory(name = name, create = True, size = SHARED_FRAME_BYTES)
+        shared_frame = cls(memory, owner = True)
+        shared_frame.sequence[0] = 0
+        shared_frame.values[:] = numpy.nan
+        shared_frame.values[PUBLISHED] = 0
+        shared_frame.frame[:] = 0
+        return shared_frame
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFrame":
+        """Open a shared frame created by another process."""
+        return cls(shared_memory.SharedMemory(name = name), owner = False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def heartbeat(self) -> None:
+        """Let the renderer know the fetcher is still alive. Safe to read without the sequence."""
+        self.values[HEARTBEAT] = time.monotonic()
+
+    def seconds_since_heartbeat(self) -> float:
+        """How long ago the fetcher last showed signs of life."""
+        last_heartbeat = self.values[HEARTBEAT]
+        if numpy.isnan(last_heartbeat):
+            return None
+        return time.monotonic() - float(last_heartbeat)
+
+    def publish(self, forecast: Forecast, frame: numpy.ndarray, fetched_at: float,
+                stale: bool
+                ) -> int:
+        """Write new readings and their frame. Returns the new sequence number.
+
+        The sequence is set to odd and then to the next even number rather than counted up twice,
+        so a writer that died halfway through a publish can't leave it odd forever."""
+        writing = int(self.sequence[0]) | 1
+        self.sequence[0] = writing
+
+        for field_index, value in enumerate(forecast):
+            # Anything that isn't a number is stored as missing, so a bad value in a snapshot
+            # can't stop every restarted fetcher from publishing.
+            self.values[4 + field_index] = as_float(value)
+        self.values[FETCHED_AT] = fetched_at
+        self.values[STALE] = 1 if stale else 0
+        self.values[PUBLISHED] = 1
+        self.frame[:] = frame
+
+        self.sequence[0] = writing + 1
+        self.heartbeat()
+        return int(self.sequence[0])
+
+    def read(self) -> dict:
+        """A consistent copy of the latest publish, or None if nothing was published yet or the
+        writer kept getting in the way."""
+        for _ in range(READ_ATTEMPTS):
+            sequence_before = int(self.sequence[0])
+            if sequence_before % 2:
+                continue
+
+            values = self.values.copy()
+            frame = self.frame.copy()
+
+            if int(self.sequence[0]) != sequence_before:
+                continue
+
+            if not values[PUBLISHED]:
+                return None
+
+            readings = [None if numpy.isnan(value) else float(value) for value in values[4:]]
+            return {
+                "sequence"  : sequence_before,
+                "forecast"  : Forecast(*readings),
+                "fetched_at": float(values[FETCHED_AT]),
+                "stale"     : bool(values[STALE]),
+                "frame"     : frame,
+                }
+
+        return None
+
+    def close(self) -> None:
+        """Stop using the shared frame; the creator also removes it."""
+        del self.sequence, self.values, self.frame
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
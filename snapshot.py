@@ -0,0 +1,82 @@
+"""Define the on-disk snapshot of the last good forecast, used to warm start after a restart"""
+import json
+import os
+import tempfile
+import time
+
+from constants import SNAPSHOT_PATH, CANONICAL_UNITS
+
+
+def save_snapshot(weather: dict, fetched_at: float = None, path: str = SNAPSHOT_PATH,
+                  units: str = CANONICAL_UNITS, location: tuple = None
+                  ) -> bool:
+    """Write the forecast, its units, its (latitude, longitude) if given and when it was fetched
+    to disk. The file is written to a temporary file first and then renamed over the old one, so
+    a crash never leaves half a snapshot behind. Returns False if it could not be written."""
+    if fetched_at is None:
+        fetched_at = time.time()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_path = None
+
+    try:
+        file_descriptor, temporary_path = tempfile.mkstemp(prefix = ".snapshot-", dir = directory)
+
+        with os.fdopen(file_descriptor, "w") as snapshot_file:
+            json.dump({
+                "fetched_at": fetched_at,
+                "units"     : units,
+                "location"  : None if location is None else list(location),
+                "weather"   : weather,
+                },
+                snapshot_file
+                )
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+
+        os.replace(temporary_path, path)
+        return True
+
+    except (OSError, TypeError, ValueError) as e:
+        print(f"snapshot: could not save snapshot to {path}: {repr(e)}")
+        if temporary_path is not None and os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        return False
+
+
+def load_snapshot(max_age: float = None, path: str = SNAPSHOT_PATH,
+                  units: str = CANONICAL_UNITS, location: tuple = None
+                  ) -> dict:
+    """Return the saved {"fetched_at", "weather"}, or None if there is none, it can't be read, it
+    is older than max_age seconds, it isn't in the given units, or it was saved for another
+    location than the one given."""
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+
+        fetched_at = float(snapshot["fetched_at"])
+        weather = snapshot["weather"]
+        snapshot_units = snapshot.get("units")
+        snapshot_location = snapshot.get("location")
+
+    except FileNotFoundError:
+        return None
+
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"snapshot: ignoring unreadable snapshot {path}: {repr(e)}")
+        return None
+
+    if units is not None and snapshot_units != units:
+        return None
+
+    if location is not None and snapshot_location not in (None, list(location)):
+        return None
+
+    age = time.time() - fetched_at
+    if max_age is not None and not 0 <= age < max_age:
+        return None
+
+    return {
+        "fetched_at": fetched_at,
+        "weather"   : weather,
+        }
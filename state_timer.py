@@ -0,0 +1,33 @@
+"""Define the timer recording how long the station spends in each state"""
+import time
+
+
+class StateTimer:
+    """Track the current state (e.g. "showing" or "hidden") and the total time spent in each."""
+
+    def __init__(self, state: str) -> None:
+        self.state = state
+        self.entered_at = time.monotonic()
+        self.totals = {}
+
+    def enter(self, state: str) -> float:
+        """Switch to a state. Returns how long was spent in the previous one; 0 if the state didn't
+        change."""
+        if state == self.state:
+            return 0.0
+
+        now = time.monotonic()
+        spent = now - self.entered_at
+        self.totals[self.state] = self.totals.get(self.state, 0.0) + spent
+
+        print("State: {} -> {} after {:.1f}s".format(self.state, state, spent))
+
+        self.state = state
+        self.entered_at = now
+        return spent
+
+    def report(self) -> dict:
+        """Total seconds spent in every state so far, including the current one."""
+        totals = dict(self.totals)
+        totals[self.state] = totals.get(self.state, 0.0) + time.monotonic() - self.entered_at
+        return {state: round(seconds, 1) for state, seconds in totals.items()}
@@ -0,0 +1,64 @@
+"""Define the local unit conversion: forecasts are fetched in one unit system and shown in any"""
+import numpy
+
+from constants import CANONICAL_UNITS
+from weather import Forecast
+
+# The unit systems the display can show, in the order holding the Y button cycles through them
+UNIT_SYSTEMS = ("metric", "imperial")
+
+# What each Forecast field measures. The other fields (percentages, the UV index) have no unit.
+TEMPERATURE_FIELDS = ("current_feels_like", "expected_feels_like", "later_feels_like",
+                      "today_high", "today_low", "tomorrow_high"
+                      )
+SPEED_FIELDS = ("current_wind_speed", "current_wind_gust", "expected_wind_speed")
+
+# A value in each unit system is its metric value * scale + offset.
+CONVERSIONS = {
+    "metric"  : {"temperature": (1.0, 0.0), "speed": (1.0, 0.0)},
+    "imperial": {"temperature": (1.8, 32.0), "speed": (2.2369362920544, 0.0)},
+    }
+
+
+def conversion_arrays(units: str) -> tuple:
+    """The (scale, offset) arrays taking every Forecast field from metric to a unit system."""
+    scale = numpy.ones(len(Forecast._fields))
+    offset = numpy.zeros(len(Forecast._fields))
+
+    for field_index, field in enumerate(Forecast._fields):
+        kind = None
+        if field in TEMPERATURE_FIELDS:
+            kind = "temperature"
+        elif field in SPEED_FIELDS:
+            kind = "speed"
+
+        if kind is not None:
+            scale[field_index], offset[field_index] = CONVERSIONS[units][kind]
+
+    return scale, offset
+
+
+CONVERSION_ARRAYS = {units: conversion_arrays(units) for units in CONVERSIONS}
+
+
+def as_float(value) -> float:
+    """A reading as a float, NaN if it is missing or not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return numpy.nan
+
+
+def convert_forecast(forecast: Forecast, units: str, from_units: str = CANONICAL_UNITS
+                     ) -> Forecast:
+    """Convert every field of a Forecast at once. Missing or unreadable readings become None."""
+    if units == from_units:
+        return forecast
+
+    from_scale, from_offset = CONVERSION_ARRAYS[from_units]
+    to_scale, to_offset = CONVERSION_ARRAYS[units]
+
+    values = numpy.array([as_float(value) for value in forecast])
+    converted = (values - from_offset) / from_scale * to_scale + to_offset
+
+    return Forecast(*[None if numpy.isnan(value) else float(value) for value in converted])
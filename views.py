@@ -0,0 +1,54 @@
+"""Define the views the Y button cycles through, each showing three readings of one forecast"""
+import numpy
+
+from layout import MAX_READING, render_reading
+
+# The Forecast fields shown on the 1st, 2nd and 3rd rows of each view, in the order they are
+# cycled through.
+VIEWS = {
+    "feels_like"   : ("current_feels_like", "expected_feels_like", "later_feels_like"),
+    "humidity"     : ("current_humidity", "expected_humidity", "later_humidity"),
+    "wind"         : ("current_wind_speed", "current_wind_gust", "expected_wind_speed"),
+    "uv"           : ("current_uvi", "expected_uvi", "today_max_uvi"),
+    "precipitation": ("current_pop", "expected_pop", "today_pop"),
+    "daily"        : ("today_high", "today_low", "tomorrow_high"),
+    }
+VIEW_NAMES = tuple(VIEWS)
+
+# Probabilities come as a fraction and are shown as a percentage.
+FRACTION_FIELDS = ("current_pop", "expected_pop", "today_pop")
+
+# Only sent by the API when there is something to report, so a missing one is left blank rather
+# than shown as an error.
+OPTIONAL_FIELDS = ("current_wind_gust",)
+
+# Percentages are shown up to 99, since only two digits fit on a row.
+PERCENT_FIELDS = FRACTION_FIELDS + ("current_humidity", "expected_humidity", "later_humidity")
+
+
+def view_value(forecast, field: str):
+    """The value of a Forecast field as it is shown."""
+    value = getattr(forecast, field)
+
+    if value is None or field not in PERCENT_FIELDS:
+        return value
+
+    try:
+        if field in FRACTION_FIELDS:
+            value = float(value) * 100
+        return min(float(value), MAX_READING)
+    except (TypeError, ValueError):
+        return value
+
+
+def render_view(pixels: numpy.ndarray, forecast, view: str = "feels_like",
+                scheme: str = "default", report: bool = True
+                ) -> None:
+    """Clear the frame and draw the three readings of a view on the 1st, 2nd and 3rd rows. Values
+    that can't be shown are printed, unless report = False."""
+    pixels[:] = 0
+    for row, field in enumerate(VIEWS[view]):
+        render_reading(pixels, row, view_value(forecast, field), field, scheme,
+                       optional = field in OPTIONAL_FIELDS,
+                       report = report
+                       )
@@ -0,0 +1,151 @@
+"""Define the typed One Call fetch: only the blocks the display uses are requested and kept"""
+import os
+from typing import NamedTuple, Optional
+
+from adjustable_settings import LOCATION_LATITUDE_, LOCATION_LONGITUDE
+from constants import GET_WEATHER_ENDPOINT, OPENWEATHER_API_KEY, CANONICAL_UNITS
+from functions import api_call_to_json, api_call_to_json_async
+
+# Every top level block the One Call API can return. Any we don't read is excluded.
+ONECALL_BLOCKS = ("current", "minutely", "hourly", "daily", "alerts")
+
+
+class Forecast(NamedTuple):
+    """The readings the display shows, pulled out of a One Call payload. "expected" is in 6 hours
+    and "later" in 12. The fields after the first three default to None so older snapshots can
+    still be loaded."""
+    current_feels_like: Optional[float]
+    expected_feels_like: Optional[float]
+    later_feels_like: Optional[float]
+    current_humidity: Optional[float] = None
+    expected_humidity: Optional[float] = None
+    later_humidity: Optional[float] = None
+    current_wind_speed: Optional[float] = None
+    current_wind_gust: Optional[float] = None
+    expected_wind_speed: Optional[float] = None
+    current_uvi: Optional[float] = None
+    expected_uvi: Optional[float] = None
+    today_max_uvi: Optional[float] = None
+    current_pop: Optional[float] = None
+    expected_pop: Optional[float] = None
+    today_pop: Optional[float] = None
+    today_high: Optional[float] = None
+    today_low: Optional[float] = None
+    tomorrow_high: Optional[float] = None
+
+
+# Where each Forecast field is found in the One Call payload
+FORECAST_FIELD_PATHS = {
+    "current_feels_like" : ("current", "feels_like"),
+    "expected_feels_like": ("hourly", 6, "feels_like"),
+    "later_feels_like"   : ("hourly", 12, "feels_like"),
+    "current_humidity"   : ("current", "humidity"),
+    "expected_humidity"  : ("hourly", 6, "humidity"),
+    "later_humidity"     : ("hourly", 12, "humidity"),
+    "current_wind_speed" : ("current", "wind_speed"),
+    "current_wind_gust"  : ("current", "wind_gust"),
+    "expected_wind_speed": ("hourly", 6, "wind_speed"),
+    "current_uvi"        : ("current", "uvi"),
+    "expected_uvi"       : ("hourly", 6, "uvi"),
+    "today_max_uvi"      : ("daily", 0, "uvi"),
+    "current_pop"        : ("hourly", 0, "pop"),
+    "expected_pop"       : ("hourly", 6, "pop"),
+    "today_pop"          : ("daily", 0, "pop"),
+    "today_high"         : ("daily", 0, "temp", "max"),
+    "today_low"          : ("daily", 0, "temp", "min"),
+    "tomorrow_high"      : ("daily", 1, "temp", "max"),
+    }
+
+
+def exclude_parameter(field_paths: dict = None) -> str:
+    """The One Call "exclude" value leaving out every block none of the fields are in."""
+    if field_paths is None:
+        field_paths = FORECAST_FIELD_PATHS
+
+    used_blocks = {path[0] for path in field_paths.values()}
+    return ",".join(block for block in ONECALL_BLOCKS if block not in used_blocks)
+
+
+def read_path(payload: dict, path: tuple):
+    """Follow a path of keys and indexes into the payload, or return None if it isn't there."""
+    value = payload
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+
+def extract_forecast(payload: dict) -> Forecast:
+    """Pull the fields the display needs out of a One Call payload."""
+    return Forecast(**{field: read_path(payload, path)
+                       for field, path in FORECAST_FIELD_PATHS.items()
+                       }
+                    )
+
+
+def forecast_from_dict(forecast_dict: dict) -> Optional[Forecast]:
+    """Rebuild a Forecast saved with _asdict(), or None if it doesn't have the right fields."""
+    try:
+        return Forecast(**forecast_dict)
+    except TypeError:
+        return None
+
+
+def onecall_parameters(latitude: float, longitude: float, units: str) -> dict:
+    """The One Call query for a location, excluding the blocks we don't use."""
+    return {
+        "lat"    : latitude,
+        "lon"    : longitude,
+        "appid"  : os.environ[OPENWEATHER_API_KEY],
+        "units"  : units,
+        "exclude": exclude_parameter(),
+        }
+
+
+def fetch_forecast(api_calls: int,
+                   latitude: float = LOCATION_LATITUDE_,
+                   longitude: float = LOCATION_LONGITUDE,
+                   units: str = CANONICAL_UNITS,
+                   **api_call_arguments
+                   ) -> [dict, int]:
+    """Fetch the forecast for a location, in CANONICAL_UNITS unless other units are given. On
+    success, "output" is a Forecast and the rest of the payload is dropped. Other keyword arguments
+    are passed on to api_call_to_json."""
+    result, api_calls = api_call_to_json(method = "GET",
+                                         name = "Weather Details",
+                                         url = GET_WEATHER_ENDPOINT,
+                                         api_calls = api_calls,
+                                         params = onecall_parameters(latitude, longitude, units),
+                                         **api_call_arguments
+                                         )
+
+    if result["result"] == "success":
+        result["output"] = extract_forecast(result["output"])
+
+    return result, api_calls
+
+
+async def fetch_forecast_async(api_calls: int,
+                               latitude: float = LOCATION_LATITUDE_,
+                               longitude: float = LOCATION_LONGITUDE,
+                               units: str = CANONICAL_UNITS,
+                               **api_call_arguments
+                               ) -> [dict, int]:
+    """fetch_forecast for asyncio, through api_call_to_json_async."""
+    result, api_calls = await api_call_to_json_async(method = "GET",
+                                                     name = "Weather Details",
+                                                     url = GET_WEATHER_ENDPOINT,
+                                                     api_calls = api_calls,
+                                                     params = onecall_parameters(latitude,
+                                                                                 longitude,
+                                                                                 units
+                                                                                 ),
+                                                     **api_call_arguments
+                                                     )
+
+    if result["result"] == "success":
+        result["output"] = extract_forecast(result["output"])
+
+    return result, api_calls
@@ -0,0 +1,222 @@
+"""Caching proxy for the One Call API, so several stations at one site share a single fetch
+
+Run it on one machine with: python3 weather_proxy.py --port 8080
+and point each station at it by setting GET_WEATHER_ENDPOINT=http://that-machine:8080/ in its
+environment. Identical requests in flight at the same time are sent upstream once, responses are
+cached by rounded latitude/longitude, units and exclude for PROXY_CACHE_TTL seconds, and the last
+good response is served if the upstream fails. GET /metrics returns the counters as JSON."""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+
+from constants import (OPENWEATHER_ENDPOINT,
+                       PROXY_CACHE_TTL,
+                       PROXY_COORDINATE_PRECISION)
+from http_client import HttpClient
+
+
+def error_entry(error: str) -> dict:
+    """A 502 answer for when the upstream API couldn't be used."""
+    return {
+        "status"      : 502,
+        "content_type": "application/json",
+        "body"        : json.dumps({"error": error}).encode(),
+        "stored_at"   : time.monotonic(),
+        }
+
+
+class Flight:
+    """One upstream request that other requests for the same key can wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.entry = None
+
+
+class WeatherCache:
+    """Fetch One Call responses from upstream with a TTL cache and single-flight requests."""
+
+    def __init__(self,
+                 upstream_url: str = OPENWEATHER_ENDPOINT,
+                 ttl: float = PROXY_CACHE_TTL,
+                 precision: int = PROXY_COORDINATE_PRECISION,
+                 client: HttpClient = None
+                 ) -> None:
+        self.upstream_url = upstream_url
+        self.ttl = ttl
+        self.precision = precision
+        self.client = HttpClient() if client is None else client
+
+        self.entries = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests"       : 0,
+            "hits"           : 0,
+            "misses"         : 0,
+            "coalesced"      : 0,
+            "stale_served"   : 0,
+            "upstream_calls" : 0,
+            "upstream_errors": 0,
+            }
+
+    def count(self, counter: str) -> None:
+        with self.lock:
+            self.counters[counter] += 1
+
+    def cache_key(self, params: dict) -> tuple:
+        """Requests for nearly the same place, in the same units and blocks, share a key."""
+        try:
+            latitude = round(float(params.get("lat", "nan")), self.precision)
+            longitude = round(float(params.get("lon", "nan")), self.precision)
+        except ValueError:
+            latitude = params.get("lat")
+            longitude = params.get("lon")
+
+        excluded = ",".join(sorted(filter(None, params.get("exclude", "").split(","))))
+        return latitude, longitude, params.get("units", "standard"), excluded, params.get("lang")
+
+    def get(self, params: dict) -> dict:
+        """Return {"status", "content_type", "body", "cache"} for a One Call query, where cache is
+        HIT, MISS, COALESCED or STALE."""
+        self.count("requests")
+        key = self.cache_key(params)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry["stored_at"] < self.ttl:
+                self.counters["hits"] += 1
+                return dict(entry, cache = "HIT")
+
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            return dict(flight.entry, cache = "COALESCED")
+
+        try:
+            flight.entry = self.fetch_upstream(key, params)
+        except Exception as e:
+            # Whatever went wrong, the waiting requests still need an answer.
+            print(f"weather_proxy: fetching {key} failed: {repr(e)}")
+            self.count("upstream_errors")
+            flight.entry = error_entry("proxy_error")
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+        return dict(flight.entry, cache = flight.entry.get("cache", "MISS"))
+
+    def fetch_upstream(self, key: tuple, params: dict) -> dict:
+        """Call the upstream API once, caching a good response and falling back to the cached one
+        on errors."""
+        self.count("upstream_calls")
+
+        try:
+            response = self.client.request("GET", self.upstream_url, params = params)
+            entry = {
+                "status"      : response.status_code,
+                "content_type": response.headers.get("content-type", "application/json"),
+                "body"        : response.content,
+                "stored_at"   : time.monotonic(),
+                }
+            failed = response.status_code >= 500 or response.status_code == 429
+
+        except requests.exceptions.RequestException as e:
+            print(f"weather_proxy: upstream request failed: {repr(e)}")
+            entry = error_entry("upstream_unreachable")
+            failed = True
+
+        if failed:
+            self.count("upstream_errors")
+            with self.lock:
+                stale = self.entries.get(key)
+            if stale is not None:
+                self.count("stale_served")
+                return dict(stale, cache = "STALE")
+            return entry
+
+        if entry["status"] == 200:
+            with self.lock:
+                self.entries[key] = entry
+
+        return entry
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return dict(self.counters, cached_entries = len(self.entries))
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """Serve One Call queries from the server's WeatherCache, and the counters on /metrics."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+
+        if url.path == "/metrics":
+            self.send(200, "application/json", json.dumps(self.server.cache.metrics()).encode())
+            return
+
+        result = self.server.cache.get(dict(parse_qsl(url.query)))
+        self.send(result["status"], result["content_type"], result["body"],
+                  {"X-Cache": result["cache"]}
+                  )
+
+    def send(self, status: int, content_type: str, body: bytes, headers: dict = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host: str = "0.0.0.0", port: int = 8080, cache: WeatherCache = None,
+                verbose: bool = False
+                ) -> ThreadingHTTPServer:
+    """Create the proxy server. Call serve_forever() on it, or use port 0 for a free port."""
+    server = ThreadingHTTPServer((host, port), ProxyHandler)
+    server.daemon_threads = True
+    server.cache = WeatherCache() if cache is None else cache
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Caching proxy for the One Call API")
+    parser.add_argument("--host", default = "0.0.0.0")
+    parser.add_argument("--port", type = int, default = 8080)
+    parser.add_argument("--upstream", default = OPENWEATHER_ENDPOINT)
+    parser.add_argument("--ttl", type = float, default = PROXY_CACHE_TTL)
+    parser.add_argument("--precision", type = int, default = PROXY_COORDINATE_PRECISION,
+                        help = "decimal places latitude and longitude are rounded to"
+                        )
+    parser.add_argument("--verbose", action = "store_true")
+    arguments = parser.parse_args()
+
+    proxy = make_server(arguments.host, arguments.port,
+                        WeatherCache(arguments.upstream, arguments.ttl, arguments.precision),
+                        arguments.verbose
+                        )
+    print(f"weather_proxy: serving on {arguments.host}:{proxy.server_port}, "
+          f"upstream {arguments.upstream}")
+    proxy.serve_forever()